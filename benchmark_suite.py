@@ -0,0 +1,285 @@
+# ============================================
+# 🏺 Hieroglyph Annotator - Headless Benchmark Suite
+# ============================================
+# Times the code behind the GUI's hot paths on synthetic wall images,
+# without a display:
+#   render   - display_image: zoom steps, then draft pans + refinement
+#   crops    - save_current_symbol: polygon masking, resize and PNG encode
+#   previews - preview_boxes: clipped crops scaled to 200 px thumbnails
+#   search   - filter_categories: symbol search, cold and memoised
+# Each wall size runs in its own process so peak memory is per size.
+# Results can be stored as a baseline and later runs compared to it.
+#
+# Usage:
+#   python benchmark_suite.py [--sizes 10,50,100,200] [--boxes 300] [--polygons 100]
+#   python benchmark_suite.py --save-baseline benchmark_baseline.json
+#   python benchmark_suite.py --compare benchmark_baseline.json [--tolerance 0.2]
+# ============================================
+
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmark_crops import make_glyph_polygon, time_call
+from hieroglyph_annotator_gui import (ByteLRUCache, GARDINER_CATALOG, ImagePyramid, SymbolSearchIndex,
+                                      peak_rss_mb, preview_thumbnail, render_crop)
+
+VIEW_SIZE = (1100, 800)  # Canvas size of the default 1400x900 window
+SAVE_SIZE = (224, 224)
+TILE_CACHE_MB = 256
+SEARCH_QUERIES = ["a1", "g17", "seated", "man", "bird", "water", "sun disk", "vessel", "n35", "rope",
+                  "crown", "z", "hand to mouth", "ibis", "stroke", "god with", "tree", "house", "b", "aa1"]
+
+
+def make_wall(megapixels, boxes, polygons, seed=0):
+    """Synthetic stone wall of about `megapixels` MP (3:2) with dark glyphs under every annotation"""
+    rng = np.random.default_rng(seed)
+    w = int((megapixels * 1e6 * 1.5) ** 0.5)
+    h = int(megapixels * 1e6 / w)
+
+    # Smooth mottled stone: coarse noise upsampled
+    coarse = rng.normal(165, 18, (max(2, h // 32), max(2, w // 32), 3)).clip(0, 255).astype(np.uint8)
+    image = cv2.resize(coarse, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    # Glyphs are 150-600 px, shrunk on small walls so every one fits inside
+    max_size = min(600, w // 2, h // 2)
+    annotations = []
+    for i in range(boxes + polygons):
+        size = int(rng.uniform(min(150, max_size), max_size))
+        cx = int(rng.uniform(size, w - size))
+        cy = int(rng.uniform(size, h - size))
+        if i < boxes:
+            x, y = cx - size // 2, cy - size // 2
+            cv2.ellipse(image, (cx, cy), (size // 3, size // 4), float(rng.uniform(0, 180)), 0, 360,
+                        (60, 50, 40), max(2, size // 20))
+            annotations.append(("box", (x, y, size, size)))
+        else:
+            polygon = make_glyph_polygon(cx, cy, size, seed=i)
+            cv2.polylines(image, [np.array(polygon, np.int32)], True, (60, 50, 40), max(2, size // 20))
+            annotations.append(("polygon", polygon))
+    return image, annotations
+
+
+def bench_render(image, repeat):
+    """Zoom from fit-to-view to 4x, then pan with draft frames and refine, as display_image does"""
+    h, w = image.shape[:2]
+    view_w, view_h = VIEW_SIZE
+    pyramid = ImagePyramid(image, ByteLRUCache(TILE_CACHE_MB * 1024 * 1024), key="bench")
+    fit = min(view_w / w, view_h / h)
+    zooms = [fit * 1.25 ** i for i in range(64) if fit * 1.25 ** i <= 4.0]
+
+    def zoom_sequence():
+        # Zoom about the image centre with full-quality renders
+        for zoom in zooms:
+            offset_x = int(w * zoom / 2 - view_w / 2)
+            offset_y = int(h * zoom / 2 - view_h / 2)
+            pyramid.render(zoom, offset_x, offset_y, view_w, view_h)
+        return len(zooms)
+
+    def pan_sequence(zoom=1.0, steps=60, step=40):
+        # Coalesced draft frames reuse the previous render, then one refinement
+        offset_x, offset_y = int(w * zoom / 2 - view_w / 2), int(h * zoom / 2 - view_h / 2)
+        previous = pyramid.render(zoom, offset_x, offset_y, view_w, view_h, cv2.INTER_NEAREST)
+        for _ in range(steps):
+            prev_x1, prev_y1 = max(0, offset_x), max(0, offset_y)
+            offset_x += step
+            offset_y += step // 2
+            previous = pyramid.render_shifted(previous, prev_x1, prev_y1, zoom, offset_x, offset_y,
+                                              view_w, view_h, cv2.INTER_NEAREST)
+        pyramid.render(zoom, offset_x, offset_y, view_w, view_h)
+        return steps + 2
+
+    # The first pass builds pyramid tiles; report it separately from warm passes
+    start = time.perf_counter()
+    zoom_sequence()
+    cold = time.perf_counter() - start
+    zoom_time, frames = time_call(zoom_sequence, repeat)
+    pan_time, pan_frames = time_call(pan_sequence, repeat)
+    return {
+        "zoom_cold_ms": cold * 1000,
+        "zoom_frames_per_sec": frames / zoom_time,
+        "pan_frames_per_sec": pan_frames / pan_time,
+    }
+
+
+def bench_crops(image, annotations, repeat):
+    """Render, mask and PNG-encode every annotation, as the save worker does"""
+    polygons = [a for a in annotations if a[0] == "polygon"]
+
+    def save_all(items):
+        for kind, geometry in items:
+            crop = render_crop(image, kind, geometry, SAVE_SIZE)
+            crop.save(io.BytesIO(), format="PNG")
+        return len(items)
+
+    all_time, count = time_call(lambda: save_all(annotations), repeat)
+    polygon_time, polygon_count = time_call(lambda: save_all(polygons), repeat)
+    return {
+        "crops_per_sec": count / all_time,
+        "polygon_crops_per_sec": polygon_count / polygon_time if polygon_count else 0.0,
+    }
+
+
+def bench_previews(image, annotations, repeat):
+    """Thumbnails of every annotation, as preview_boxes builds them"""
+    def previews():
+        for kind, geometry in annotations:
+            preview_thumbnail(image, kind, geometry)
+        return len(annotations)
+
+    seconds, count = time_call(previews, repeat)
+    return {"previews_per_sec": count / seconds}
+
+
+def bench_search(repeat):
+    """Symbol search over the Gardiner catalog: index build, first (cold) and memoised queries"""
+    queries = [q[:end] for q in SEARCH_QUERIES for end in range(1, len(q) + 1)]  # As typed
+    start = time.perf_counter()
+    index = SymbolSearchIndex(GARDINER_CATALOG.codes, GARDINER_CATALOG.descriptions)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query)
+    cold = time.perf_counter() - start
+    warm, _ = time_call(lambda: [index.search(query) for query in queries], repeat)
+    return {
+        "index_build_ms": build * 1000,
+        "cold_queries_per_sec": len(queries) / cold,
+        "warm_queries_per_sec": len(queries) / warm,
+    }
+
+
+def run_size(megapixels, boxes, polygons, repeat):
+    """All image benchmarks for one wall size (runs in a fresh worker process)"""
+    start = time.perf_counter()
+    image, annotations = make_wall(megapixels, boxes, polygons)
+    generate = time.perf_counter() - start
+    result = {
+        "image": f"{image.shape[1]}x{image.shape[0]}",
+        "generate_s": generate,
+        "render": bench_render(image, repeat),
+        "crops": bench_crops(image, annotations, repeat),
+        "previews": bench_previews(image, annotations, repeat),
+    }
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_search(repeat):
+    result = {"search": bench_search(repeat)}
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def in_fresh_process(func, *args):
+    """Run func in a new process so its peak memory is measured on its own"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(func, *args).result()
+
+
+def flatten(results):
+    """{"10MP/render/pan_frames_per_sec": value, ...} for every numeric metric"""
+    flat = {}
+    for group, metrics in results.items():
+        for name, value in metrics.items():
+            if isinstance(value, dict):
+                for metric, number in value.items():
+                    flat[f"{group}/{name}/{metric}"] = number
+            elif isinstance(value, (int, float)):
+                flat[f"{group}/{name}"] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a baseline: lower throughput or higher memory/time beyond tolerance"""
+    current, previous = flatten(results), flatten(baseline["results"])
+    regressions = []
+    for key, before in sorted(previous.items()):
+        after = current.get(key)
+        if after is None or not before or key.endswith("generate_s"):
+            continue
+        lower_is_better = key.endswith(("_ms", "_s", "_mb"))
+        change = (after - before) / before
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        marker = "REGRESSION" if worse else "ok"
+        print(f"  {key:55s} {before:12.1f} -> {after:12.1f} ({change:+.0%}) {marker}")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+
+def print_results(results):
+    for group, metrics in results.items():
+        print(f"{group}:")
+        for name, value in metrics.items():
+            if isinstance(value, dict):
+                print(f"  {name}: " + ", ".join(f"{metric} {number:.1f}" for metric, number in value.items()))
+            elif isinstance(value, float):
+                print(f"  {name}: {value:.1f}")
+            else:
+                print(f"  {name}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the annotator's hot paths on synthetic walls")
+    parser.add_argument("--sizes", default="10,50,100,200", help="Comma-separated wall sizes in megapixels")
+    parser.add_argument("--boxes", type=int, default=300, help="Boxes per wall")
+    parser.add_argument("--polygons", type=int, default=100, help="Polygons per wall")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement (best is kept)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Store the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a stored baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown (default 20%%)")
+    args = parser.parse_args()
+    try:
+        sizes = [float(v) for v in args.sizes.split(",")]
+    except ValueError:
+        parser.error(f"invalid --sizes: {args.sizes}")
+    if min(sizes) < 0.01:
+        parser.error("wall sizes must be at least 0.01 MP")
+
+    results = {}
+    for megapixels in sizes:
+        label = f"{megapixels:g}MP"
+        print(f"Running {label} wall with {args.boxes} boxes and {args.polygons} polygons...")
+        results[label] = in_fresh_process(run_size, megapixels, args.boxes, args.polygons, args.repeat)
+    print("Running symbol search...")
+    results["catalog"] = in_fresh_process(run_search, args.repeat)
+    print_results(results)
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "processor": platform.processor(), "cpus": multiprocessing.cpu_count(),
+                    "opencv": cv2.__version__, "numpy": np.__version__},
+        "settings": {"boxes": args.boxes, "polygons": args.polygons, "repeat": args.repeat,
+                     "view": list(VIEW_SIZE), "save_size": list(SAVE_SIZE)},
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != report["machine"]:
+            print("Note: the baseline was recorded on a different machine or library versions")
+        print(f"Comparison with {args.compare} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,2845 @@
 # for hieroglyph symbol extraction and labeling by Gardiner category.
 # ============================================
 
+import time
+STARTUP_TIME = time.perf_counter()  # Reference point for the startup timing report
+
 import os
-import cv2
-import numpy as np
+import io
+import sys
+import json
+import argparse
+import hashlib
+import importlib
+import shutil
+import sqlite3
+import re
+import bisect
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
 import threading
+import queue
+import functools
+import traceback
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+
+class _LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# OpenCV and NumPy take a few hundred ms to import and are only needed once
+# an image is loaded, so they are imported on first use (or by warm_imports)
+cv2 = _LazyModule("cv2")
+np = _LazyModule("numpy")
+
+
+def warm_imports():
+    """Import the heavy modules ahead of first use (run on a background thread)"""
+    cv2.INTER_LINEAR
+    np.uint8
+
+
+class StartupTimer:
+    """Records named startup milestones and prints them as one report"""
+
+    def __init__(self, start=STARTUP_TIME):
+        self.start = start
+        self.marks = []
+        self.reported = False
+
+    def mark(self, name):
+        if not self.reported:
+            self.marks.append((name, time.perf_counter() - self.start))
+
+    def report(self):
+        if not self.reported:
+            self.reported = True
+            print("Startup: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.marks))
+
+
+# ============================================
+# Tracing
+# ============================================
+
+class Tracer:
+    """Timing spans, counters and stall samples, exportable as Chrome trace events
+
+    Spans come from `with TRACER.span(name):` blocks or the @traced
+    decorator and are kept (with the thread that ran them) in a bounded
+    buffer of the most recent max_events; it stays small unless a full
+    trace is wanted (see keep_events). Per-name totals stay available
+    for the HUD and the exit summary. export() writes the JSON object
+    format read by chrome://tracing and Perfetto.
+    """
+
+    FULL_EVENTS = 200000  # Buffer size while recording a full trace (up to about 100 MB)
+
+    def __init__(self, max_events=2000, start=STARTUP_TIME):
+        self.enabled = True
+        self.start = start
+        self.events = deque(maxlen=max_events)
+        self.stats = {}  # name -> [count, total s, max s, last s]
+        self.thread_names = {}
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def keep_events(self, max_events):
+        """Resize the event buffer, keeping the most recent events"""
+        with self._lock:
+            if max_events != self.events.maxlen:
+                self.events = deque(self.events, maxlen=max_events)
+
+    def _timestamp(self, seconds):
+        return round((seconds - self.start) * 1e6, 1)  # Microseconds since startup
+
+    def _add(self, event):
+        thread = threading.current_thread()
+        event.update(pid=self.pid, tid=thread.ident)
+        with self._lock:
+            self.thread_names.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block as one complete ("X") event"""
+        if not self.enabled:
+            yield
+            return
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, begin, time.perf_counter() - begin, **args)
+
+    def complete(self, name, begin, duration, **args):
+        """Record a span that started at perf_counter() time `begin`"""
+        event = {"name": name, "ph": "X", "ts": self._timestamp(begin), "dur": round(duration * 1e6, 1)}
+        if args:
+            event["args"] = args
+        self._add(event)
+        with self._lock:
+            stats = self.stats.setdefault(name, [0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            stats[3] = duration
+
+    def instant(self, name, **args):
+        """Record a point in time, such as a stall sample"""
+        if self.enabled:
+            self._add({"name": name, "ph": "i", "s": "t", "ts": self._timestamp(time.perf_counter()), "args": args})
+
+    def counter(self, name, **values):
+        """Record the current value of one or more counters"""
+        if self.enabled:
+            self._add({"name": name, "ph": "C", "ts": self._timestamp(time.perf_counter()), "args": values})
+
+    def last(self, name):
+        """Duration in seconds of the most recent span called `name` (0 if none)"""
+        with self._lock:
+            stats = self.stats.get(name)
+        return stats[3] if stats else 0.0
+
+    def summary(self):
+        """One line per span name: count, mean and max in ms, slowest total first"""
+        with self._lock:
+            stats = sorted(self.stats.items(), key=lambda item: -item[1][1])
+        return [f"{name}: {count}x, mean {total / count * 1000:.1f} ms, max {longest * 1000:.1f} ms"
+                for name, (count, total, longest, _) in stats]
+
+    def export(self, path):
+        """Write the buffered events as Chrome trace-event JSON"""
+        with self._lock:
+            events = list(self.events)
+            names = dict(self.thread_names)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in names.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+TRACER = Tracer()
+
+
+def traced(name=None):
+    """Decorator recording every call of a function as a TRACER span"""
+    def decorate(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class StallWatchdog:
+    """Samples the main thread's stack while the Tk event loop is stalled
+
+    The main loop calls beat() from a periodic `after` callback; the first
+    beat starts the watchdog, so startup work before the event loop runs
+    is not reported. A background thread checks the time since the last
+    beat; once it exceeds
+    `threshold` seconds it records the main thread's current stack as a
+    "stall sample" trace event (repeating every `threshold` while the
+    stall lasts), and the whole stall becomes a "stall" span when beats
+    resume.
+    """
+
+    def __init__(self, tracer, threshold=0.25, max_samples=8):
+        self.tracer = tracer
+        self.threshold = threshold
+        self.max_samples = max_samples  # Stack samples kept per stall
+        self.main_thread = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.stall_start = None
+        self.samples = 0
+        self.stalls = 0
+        self._stop = threading.Event()
+        self._thread = None  # Started by the first beat
+
+    def beat(self):
+        """Called from the main loop; closes a stall that just ended"""
+        now = time.perf_counter()
+        if self._thread is None:
+            self.last_beat = now
+            self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+            self._thread.start()
+        stall_start = self.stall_start
+        if stall_start is not None:
+            self.stall_start = None
+            self.tracer.complete("stall", stall_start, now - stall_start, samples=self.samples)
+            print(f"Main loop stalled for {(now - stall_start) * 1000:.0f} ms")
+        self.last_beat = now
+
+    def _run(self):
+        while not self._stop.wait(self.threshold / 2):
+            last_beat = self.last_beat
+            if time.perf_counter() - last_beat < self.threshold:
+                continue
+            if self.stall_start is None:
+                self.stall_start = last_beat
+                self.samples = 0
+                self.stalls += 1
+            if self.samples < self.max_samples:
+                frame = sys._current_frames().get(self.main_thread)
+                if frame is not None:
+                    self.samples += 1
+                    stack = [f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in traceback.extract_stack(frame)]
+                    self.tracer.instant("stall sample", stack=stack[::-1])
+                    self._stop.wait(self.threshold / 2)  # Together with the loop wait: one sample per threshold
+
+    def stop(self):
+        self._stop.set()
+
+
+# ============================================
+# Viewport rendering
+# ============================================
+
+def render_viewport(image, zoom, offset_x, offset_y, view_w, view_h, interpolation=None):
+    """Render only the part of the image visible through a view_w x view_h window
+
+    Equivalent to resizing the whole image by `zoom` and slicing out
+    [offset_y:offset_y+view_h, offset_x:offset_x+view_w], but the cost
+    depends on the window size instead of the image size.
+    """
+    if interpolation is None:
+        interpolation = cv2.INTER_LINEAR
+
+    h, w = image.shape[:2]
+    scaled_w = int(w * zoom)
+    scaled_h = int(h * zoom)
+
+    # Visible region in scaled-image coordinates
+    x1 = max(0, offset_x)
+    y1 = max(0, offset_y)
+    x2 = min(x1 + view_w, scaled_w)
+    y2 = min(y1 + view_h, scaled_h)
+    if x2 <= x1 or y2 <= y1:
+        return None
+
+    # Same per-axis scale cv2.resize would use for the full image
+    scale_x = scaled_w / w
+    scale_y = scaled_h / h
+
+    # Source pixels feeding the window, with a margin for the interpolation kernel
+    src_x1 = max(0, int(x1 / scale_x) - 2)
+    src_y1 = max(0, int(y1 / scale_y) - 2)
+    src_x2 = min(w, int(np.ceil(x2 / scale_x)) + 2)
+    src_y2 = min(h, int(np.ceil(y2 / scale_y)) + 2)
+    source = image[src_y1:src_y2, src_x1:src_x2]
+
+    return warp_region(source, src_x1, src_y1, scale_x, scale_y, x1, y1, x2 - x1, y2 - y1, interpolation)
+
+
+def warp_region(source, src_x1, src_y1, scale_x, scale_y, x1, y1, out_w, out_h, interpolation):
+    """Resample a source region into an out_w x out_h window starting at scaled (x1, y1)"""
+    # Output pixel (u, v) samples the same source position cv2.resize would:
+    # src = (dst + 0.5) / scale - 0.5, shifted into the cropped source region
+    matrix = np.array([
+        [1.0 / scale_x, 0.0, (x1 + 0.5) / scale_x - 0.5 - src_x1],
+        [0.0, 1.0 / scale_y, (y1 + 0.5) / scale_y - 0.5 - src_y1],
+    ], dtype=np.float64)
+    return cv2.warpAffine(
+        source, matrix, (out_w, out_h),
+        flags=interpolation | cv2.WARP_INVERSE_MAP,
+        borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+# ============================================
+# Multi-resolution image pyramid
+# ============================================
+
+class ByteLRUCache:
+    """Bounded LRU cache of arrays with a byte budget and hit/miss counters
+
+    Used for pyramid tiles and for decoded images. Thread-safe, since the
+    prefetch workers fill it from background threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a cached array (marking it most recently used) or None"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store an array, evicting least recently used entries to stay within budget"""
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._items[key] = value
+            self.current_bytes += value.nbytes
+            while self.current_bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class ImagePyramid:
+    """Tiled mip pyramid (levels at powers of two) over a full-resolution image
+
+    Level 0 is the image itself and is sliced directly. Coarser levels are
+    never materialised as whole arrays: each tile is built on demand by
+    downsampling the 2x2 block of tiles below it and kept in a shared
+    ByteLRUCache, so memory stays within the cache budget.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, image, cache, key):
+        self.base = image
+        self.cache = cache
+        self.key = key
+
+        # Level sizes halve (rounding up) until the image fits in one tile
+        h, w = image.shape[:2]
+        self.level_sizes = [(w, h)]
+        while max(w, h) > self.TILE_SIZE:
+            w = (w + 1) // 2
+            h = (h + 1) // 2
+            self.level_sizes.append((w, h))
+
+    @property
+    def num_levels(self):
+        return len(self.level_sizes)
+
+    def level_for_scale(self, scale):
+        """Pick the coarsest level that still has at least `scale` resolution"""
+        level = 0
+        while level + 1 < self.num_levels and scale <= 0.5 ** (level + 1):
+            level += 1
+        return level
+
+    def tile(self, level, tx, ty):
+        """Return tile (tx, ty) of the given level"""
+        t = self.TILE_SIZE
+        level_w, level_h = self.level_sizes[level]
+        x1, y1 = tx * t, ty * t
+        x2, y2 = min(x1 + t, level_w), min(y1 + t, level_h)
+        if level == 0:
+            return self.base[y1:y2, x1:x2]
+
+        key = (self.key, level, tx, ty)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+
+        # Downsample the matching 2x2 block of the level below
+        below = self.region(level - 1, 2 * x1, 2 * y1, 2 * x2, 2 * y2)
+        tile = cv2.resize(below, (x2 - x1, y2 - y1), interpolation=cv2.INTER_AREA)
+        self.cache.put(key, tile)
+        return tile
+
+    def region(self, level, x1, y1, x2, y2):
+        """Composite the tiles covering [x1, x2) x [y1, y2) of a level"""
+        level_w, level_h = self.level_sizes[level]
+        x2 = min(x2, level_w)
+        y2 = min(y2, level_h)
+        if level == 0:
+            return self.base[y1:y2, x1:x2]
+
+        t = self.TILE_SIZE
+        out = np.empty((y2 - y1, x2 - x1) + self.base.shape[2:], dtype=self.base.dtype)
+        for ty in range(y1 // t, (y2 - 1) // t + 1):
+            for tx in range(x1 // t, (x2 - 1) // t + 1):
+                tile = self.tile(level, tx, ty)
+                # Intersection of this tile with the requested region
+                ix1, iy1 = max(x1, tx * t), max(y1, ty * t)
+                ix2, iy2 = min(x2, tx * t + tile.shape[1]), min(y2, ty * t + tile.shape[0])
+                out[iy1 - y1:iy2 - y1, ix1 - x1:ix2 - x1] = tile[iy1 - ty * t:iy2 - ty * t, ix1 - tx * t:ix2 - tx * t]
+        return out
+
+    def render(self, zoom, offset_x, offset_y, view_w, view_h, interpolation=None):
+        """Render the visible window from the nearest pyramid level"""
+        if interpolation is None:
+            interpolation = cv2.INTER_LINEAR
+
+        h, w = self.base.shape[:2]
+        scaled_w = int(w * zoom)
+        scaled_h = int(h * zoom)
+        level = self.level_for_scale(min(scaled_w / w, scaled_h / h))
+        if level == 0:
+            return render_viewport(self.base, zoom, offset_x, offset_y, view_w, view_h, interpolation)
+
+        # Visible region in scaled-image coordinates
+        x1 = max(0, offset_x)
+        y1 = max(0, offset_y)
+        x2 = min(x1 + view_w, scaled_w)
+        y2 = min(y1 + view_h, scaled_h)
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        # Scale from level pixels to screen pixels
+        factor = 2 ** level
+        scale_x = scaled_w / w * factor
+        scale_y = scaled_h / h * factor
+
+        level_w, level_h = self.level_sizes[level]
+        src_x1 = max(0, int(x1 / scale_x) - 2)
+        src_y1 = max(0, int(y1 / scale_y) - 2)
+        src_x2 = min(level_w, int(np.ceil(x2 / scale_x)) + 2)
+        src_y2 = min(level_h, int(np.ceil(y2 / scale_y)) + 2)
+        source = self.region(level, src_x1, src_y1, src_x2, src_y2)
+
+        return warp_region(source, src_x1, src_y1, scale_x, scale_y, x1, y1, x2 - x1, y2 - y1, interpolation)
+
+    def render_shifted(self, previous, prev_x1, prev_y1, zoom, offset_x, offset_y, view_w, view_h,
+                       interpolation=None):
+        """Render the visible window reusing a previous render at the same zoom
+
+        `previous` holds the scaled-image region starting at (prev_x1, prev_y1).
+        The overlapping part is copied and only the newly exposed strips are
+        resampled, which is what a pan drag needs between two frames.
+        """
+        h, w = self.base.shape[:2]
+        scaled_w = int(w * zoom)
+        scaled_h = int(h * zoom)
+        x1 = max(0, offset_x)
+        y1 = max(0, offset_y)
+        x2 = min(x1 + view_w, scaled_w)
+        y2 = min(y1 + view_h, scaled_h)
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        # Overlap with the previous render, in scaled-image coordinates
+        prev_h, prev_w = previous.shape[:2]
+        ox1 = max(x1, prev_x1)
+        oy1 = max(y1, prev_y1)
+        ox2 = min(x2, prev_x1 + prev_w)
+        oy2 = min(y2, prev_y1 + prev_h)
+        if ox2 <= ox1 or oy2 <= oy1:
+            return self.render(zoom, offset_x, offset_y, view_w, view_h, interpolation)
+
+        result = np.empty((y2 - y1, x2 - x1) + previous.shape[2:], dtype=previous.dtype)
+        result[oy1 - y1:oy2 - y1, ox1 - x1:ox2 - x1] = \
+            previous[oy1 - prev_y1:oy2 - prev_y1, ox1 - prev_x1:ox2 - prev_x1]
+
+        # Exposed strips: full-width above and below the overlap, then left and right of it
+        strips = [(x1, y1, x2, oy1), (x1, oy2, x2, y2), (x1, oy1, ox1, oy2), (ox2, oy1, x2, oy2)]
+        for sx1, sy1, sx2, sy2 in strips:
+            if sx2 > sx1 and sy2 > sy1:
+                strip = self.render(zoom, sx1, sy1, sx2 - sx1, sy2 - sy1, interpolation)
+                result[sy1 - y1:sy2 - y1, sx1 - x1:sx2 - x1] = strip
+        return result
+
+
+# ============================================
+# Crop extraction
+# ============================================
+
+def clip_box(box, img_w, img_h):
+    """Clip an (x, y, w, h) box to the image, returning (x1, y1, x2, y2) or None if empty"""
+    x, y, w, h = box
+    x1 = max(0, min(x, img_w))
+    y1 = max(0, min(y, img_h))
+    x2 = max(0, min(x + w, img_w))
+    y2 = max(0, min(y + h, img_h))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def polygon_bounds(polygon, img_w, img_h):
+    """Bounding box (x1, y1, x2, y2) of an image-space polygon clipped to the image, or None"""
+    points = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+    min_x, min_y = points.min(axis=0)
+    max_x, max_y = points.max(axis=0)
+    x1 = max(0, min(img_w, int(min_x)))
+    y1 = max(0, min(img_h, int(min_y)))
+    x2 = max(0, min(img_w, int(max_x)))
+    y2 = max(0, min(img_h, int(max_y)))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def crop_box(image, box):
+    """Crop an (x, y, w, h) box from an RGB image; returns (crop, bounds) or None"""
+    img_h, img_w = image.shape[:2]
+    bounds = clip_box(box, img_w, img_h)
+    if bounds is None:
+        return None
+    x1, y1, x2, y2 = bounds
+    return image[y1:y2, x1:x2], bounds
+
+
+def crop_polygon(image, polygon, background=None):
+    """Cut an image-space polygon out of an RGB image; returns (crop, bounds) or None
+
+    The mask is only as large as the polygon's bounding box. Pixels outside
+    the polygon are transparent (RGBA output), or filled with the RGB
+    `background` colour when one is given (RGB output).
+    """
+    img_h, img_w = image.shape[:2]
+    bounds = polygon_bounds(polygon, img_w, img_h)
+    if bounds is None:
+        return None
+    x1, y1, x2, y2 = bounds
+
+    # Rasterise the polygon into a mask the size of its bounding box
+    points = np.asarray(polygon, dtype=np.int32).reshape(-1, 1, 2) - np.array([x1, y1], dtype=np.int32)
+    mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+    cv2.fillPoly(mask, [points], 255)
+
+    region = image[y1:y2, x1:x2]
+    inside = mask > 0
+    if background is None:
+        crop = np.zeros((y2 - y1, x2 - x1, 4), dtype=np.uint8)
+        crop[inside, :3] = region[inside]
+        crop[inside, 3] = 255
+    else:
+        crop = np.empty_like(region)
+        crop[:] = background
+        crop[inside] = region[inside]
+    return crop, bounds
+
+
+def render_crop(image, kind, geometry, size, background=None):
+    """Crop a box or polygon annotation and resize it to `size`; returns a PIL image or None"""
+    if kind == "box":
+        result = crop_box(image, geometry)
+    else:
+        result = crop_polygon(image, geometry, background)
+    if result is None:
+        return None
+    crop, _ = result
+    return Image.fromarray(crop).resize(size, Image.Resampling.LANCZOS)
+
+
+def preview_thumbnail(image, kind, geometry, max_size=200):
+    """Crop of an annotation scaled to fit max_size (polygons on transparency), plus its bounds"""
+    result = crop_box(image, geometry) if kind == "box" else crop_polygon(image, geometry)
+    if result is None:
+        return None
+    crop, bounds = result
+    thumbnail = Image.fromarray(crop) if kind == "box" else Image.fromarray(crop, 'RGBA')
+    thumbnail.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return thumbnail, bounds
+
+
+# ============================================
+# Annotation database
+# ============================================
+
+ANNOTATION_DB = "annotations.db"  # SQLite store of every annotation, inside OUTPUT_DIR
+
+
+def annotation_hash(image, kind, geometry):
+    """SHA-1 of the pixels an annotation covers (None if it is empty)"""
+    if kind == "box":
+        result = crop_box(image, geometry)
+    else:
+        result = crop_polygon(image, geometry)
+    if result is None:
+        return None
+    crop, _ = result
+    return hashlib.sha1(np.ascontiguousarray(crop).tobytes()).hexdigest()
+
+
+# '<image>_box_003' (numbered, before content addressing) or '<image>_polygon_<hash>'
+CROP_NAME = re.compile(r"^(.+)_(?:box|polygon)(?:_[0-9a-f]+)?$")
+
+
+def crop_name_stem(rel_path):
+    """Crop file name prefix of an image path relative to INPUT_DIR
+
+    Images in subfolders get the folder path in the name, joined by "__",
+    so equal file names in different folders cannot collide.
+    """
+    return os.path.splitext(rel_path)[0].replace(os.sep, "__")
+
+
+def crop_files(output_dir):
+    """(code, path relative to output_dir) of every PNG crop in the per-code folders"""
+    if not os.path.isdir(output_dir):
+        return
+    for code in sorted(os.listdir(output_dir)):
+        folder = os.path.join(output_dir, code)
+        if code.startswith(".") or code == PACKED_DIR or not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(".png"):
+                yield code, os.path.join(code, name)
+
+
+class AnnotationDatabase:
+    """SQLite (WAL mode) store of annotation geometry, code and provenance
+
+    An annotation is inserted as soon as it is drawn, gets its Gardiner code
+    when it is saved and its output path (PNG) and/or packed location once
+    the crop is written.
+    Unlabelled annotations are removed again when the canvas is cleared.
+    Geometry is stored in image pixel coordinates as JSON, plus its
+    bounding box as columns.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS annotations (
+            id INTEGER PRIMARY KEY,
+            image TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            geometry TEXT NOT NULL,
+            x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+            code TEXT,
+            content_hash TEXT,
+            output TEXT,
+            packed TEXT,
+            created REAL NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_annotations_image ON annotations (image);
+        CREATE TABLE IF NOT EXISTS image_status (
+            image TEXT PRIMARY KEY,
+            saved INTEGER NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS session (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS crops (
+            hash TEXT NOT NULL,
+            code TEXT NOT NULL,
+            phash INTEGER NOT NULL,
+            image TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            geometry TEXT NOT NULL,
+            x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+            output TEXT,
+            packed TEXT,
+            annotation INTEGER,
+            created REAL NOT NULL,
+            PRIMARY KEY (hash, code)
+        );
+        CREATE INDEX IF NOT EXISTS idx_crops_image ON crops (image, code);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Shared by the Tk thread and the save worker, serialised by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(self.SCHEMA)
+
+    def add(self, image, kind, geometry, content_hash=None):
+        """Insert a new (unlabelled) annotation and return its id"""
+        if kind == "box":
+            x, y, w, h = geometry
+            bounds = (x, y, x + w, y + h)
+        else:
+            xs = [p[0] for p in geometry]
+            ys = [p[1] for p in geometry]
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        now = time.time()
+        geometry = [list(p) for p in geometry] if kind == "polygon" else list(geometry)
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO annotations (image, kind, geometry, x1, y1, x2, y2, content_hash, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (image, kind, json.dumps(geometry), *[int(v) for v in bounds], content_hash, now, now))
+            return cursor.lastrowid
+
+    def set_code(self, annotation_ids, code):
+        """Assign a Gardiner code to annotations and update the status of their images"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE annotations SET code = ?, updated = ? WHERE id = ?",
+                                  [(code, now, i) for i in annotation_ids])
+            placeholders = ",".join("?" * len(annotation_ids))
+            images = [row[0] for row in self.conn.execute(
+                f"SELECT DISTINCT image FROM annotations WHERE id IN ({placeholders})", list(annotation_ids))]
+            for image in images:
+                self.conn.execute(
+                    "INSERT INTO image_status (image, saved, updated) "
+                    "VALUES (?, (SELECT COUNT(*) FROM annotations WHERE image = ? AND code IS NOT NULL), ?) "
+                    "ON CONFLICT (image) DO UPDATE SET saved = excluded.saved, updated = excluded.updated",
+                    (image, image, now))
+
+    def mark_saved(self, annotation_id, output, packed=None):
+        """Record where an annotation's crop was written
+
+        `output` is the PNG file relative to the output folder and `packed`
+        the packed_location() of its shard record; either may be None.
+        """
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE annotations SET output = ?, packed = ?, updated = ? WHERE id = ?",
+                              (output, packed, time.time(), annotation_id))
+
+    def set_content_hash(self, annotation_id, content_hash):
+        """Fill in the crop hash of an annotation drawn before its pixels were available"""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE annotations SET content_hash = ? WHERE id = ?",
+                              (content_hash, annotation_id))
+
+    def discard_unlabelled(self, annotation_ids):
+        """Delete annotations that were cleared before getting a code"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM annotations WHERE id = ? AND code IS NULL",
+                                  [(i,) for i in annotation_ids])
+
+    def _rows(self, query, params=()):
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(row, geometry=json.loads(row["geometry"])) for row in rows]
+
+    def annotations_for_image(self, image):
+        """All labelled annotations of one source image"""
+        return self._rows("SELECT * FROM annotations WHERE image = ? AND code IS NOT NULL ORDER BY id", (image,))
+
+    def saved_annotations(self):
+        """Annotations with a written crop, keeping the latest per PNG file or packed record"""
+        latest = {}
+        for row in self._rows("SELECT * FROM annotations WHERE output IS NOT NULL OR packed IS NOT NULL "
+                              "ORDER BY updated, id"):
+            latest[row["output"] or row["packed"]] = row
+        return list(latest.values())
+
+    def seed_status(self, counts):
+        """Count crops saved before the database ({image: crops}) towards the image status"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO image_status (image, saved, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (image) DO UPDATE SET saved = MAX(saved, excluded.saved)",
+                [(image, count, now) for image, count in counts.items()])
+
+    def annotated_images(self):
+        """Paths of the source images with at least one labelled annotation"""
+        with self._lock:
+            rows = self.conn.execute("SELECT image FROM image_status WHERE saved > 0").fetchall()
+        return [row[0] for row in rows]
+
+    def get_session(self, key, default=None):
+        """Read a value remembered between sessions (such as the last image)"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM session WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_session(self, key, value):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO session (key, value) VALUES (?, ?)", (key, value))
+
+    def find_crop(self, content_hash, code):
+        """The stored crop with this content hash and code, or None"""
+        rows = self._rows("SELECT * FROM crops WHERE hash = ? AND code = ?", (content_hash, code))
+        return rows[0] if rows else None
+
+    def crops_for_image(self, image, code):
+        """Stored crops of one source image under one code"""
+        return self._rows("SELECT * FROM crops WHERE image = ? AND code = ?", (image, code))
+
+    def add_crop(self, content_hash, code, phash, image, kind, geometry, output, annotation_id=None, packed=None):
+        """Record a written crop under its content hash (ignored if already known)"""
+        points = [geometry[:2], (geometry[0] + geometry[2], geometry[1] + geometry[3])] if kind == "box" else geometry
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        geometry = [list(p) for p in geometry] if kind == "polygon" else list(geometry)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO crops (hash, code, phash, image, kind, geometry, x1, y1, x2, y2, output, "
+                "packed, annotation, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, code, phash, image, kind, json.dumps(geometry), int(min(xs)), int(min(ys)),
+                 int(max(xs)), int(max(ys)), output, packed, annotation_id, time.time()))
+
+    def move_crop(self, output, content_hash, phash, record):
+        """Point everything stored under record's crop at a regenerated PNG file
+
+        Records without a PNG yet (packed-only) are matched by their packed location.
+        """
+        geometry = [list(p) for p in record["geometry"]] if record["kind"] == "polygon" else list(record["geometry"])
+        column, old = ("output", record["output"]) if record["output"] else ("packed", record["packed"])
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE annotations SET output = ?, updated = ? WHERE {column} = ?",
+                              (output, now, old))
+            self.conn.execute(f"DELETE FROM crops WHERE {column} = ?", (old,))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO crops (hash, code, phash, image, kind, geometry, x1, y1, x2, y2, output, "
+                "packed, annotation, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, record["code"], phash, record["image"], record["kind"], json.dumps(geometry),
+                 record["x1"], record["y1"], record["x2"], record["y2"], output, record["packed"], record["id"], now))
+
+    def relocate_packed(self, size, moves):
+        """Replace every packed location of one crop size after its shards were rebuilt
+
+        `moves` holds (record, new location) pairs; locations of that size
+        not covered by a move no longer exist and are cleared.
+        """
+        prefix = f"{size[0]}x{size[1]}/"
+        with self._lock, self.conn:
+            # Resolve the rows first: new locations can equal other records' old ones
+            targets = []
+            for record, location in moves:
+                ids = [row[0] for row in self.conn.execute(
+                    "SELECT id FROM annotations WHERE id = ? OR packed = ?", (record["id"], record["packed"]))]
+                crops = [row[0] for row in self.conn.execute(
+                    "SELECT rowid FROM crops WHERE annotation = ? OR packed = ?", (record["id"], record["packed"]))]
+                targets.append((location, ids, crops))
+            self.conn.execute("UPDATE annotations SET packed = NULL WHERE substr(packed, 1, ?) = ?",
+                              (len(prefix), prefix))
+            self.conn.execute("UPDATE crops SET packed = NULL WHERE substr(packed, 1, ?) = ?", (len(prefix), prefix))
+            for location, ids, crops in targets:
+                self.conn.executemany("UPDATE annotations SET packed = ? WHERE id = ?", [(location, i) for i in ids])
+                self.conn.executemany("UPDATE crops SET packed = ? WHERE rowid = ?", [(location, i) for i in crops])
+
+    def count_by_code(self):
+        """Number of stored crops per Gardiner code (near-duplicates that were skipped are not counted)"""
+        with self._lock:
+            rows = self.conn.execute("SELECT code, COUNT(*) FROM crops GROUP BY code ORDER BY code").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+# ============================================
+# Annotation progress
+# ============================================
+
+class ImageProgress:
+    """Annotation status of every image in the list, for progress counts and fast navigation
+
+    Counts are kept up to date as images are added and saved. "Next
+    unannotated" uses a next-pointer array with path compression (each
+    annotated index points past itself), so a lookup is amortised
+    near-constant time; the array and the path -> index map are rebuilt
+    lazily after the list changes.
+    """
+
+    def __init__(self, annotated):
+        self.annotated = set(annotated)
+        self.paths = []
+        self.done = 0
+        self._index = None  # path -> position in self.paths
+        self._next = None   # position -> smallest unannotated position at or after it
+
+    def add_paths(self, paths):
+        """Count newly discovered images (their order is set by reset)"""
+        self.done += sum(1 for path in paths if path in self.annotated)
+        self._index = None
+
+    def reset(self, paths):
+        """Adopt the current image list (rebuilt when next needed)"""
+        self.paths = paths
+        self._index = None
+
+    def _build(self):
+        self._index = {path: i for i, path in enumerate(self.paths)}
+        n = len(self.paths)
+        self._next = [i + 1 if path in self.annotated else i for i, path in enumerate(self.paths)] + [n]
+        self.done = sum(1 for path in self.paths if path in self.annotated)
+
+    def _find(self, i):
+        root = i
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[i] != root:
+            self._next[i], i = root, self._next[i]
+        return root
+
+    def index_of(self, path):
+        """Position of an image in the list, or None"""
+        if self._index is None:
+            self._build()
+        return self._index.get(path)
+
+    def mark_annotated(self, path):
+        if path in self.annotated:
+            return
+        self.annotated.add(path)
+        self.done += 1
+        if self._index is not None and path in self._index:
+            i = self._index[path]
+            self._next[i] = i + 1
+
+    def next_unannotated(self, start):
+        """First unannotated position after `start`, wrapping around; None if all are done"""
+        if self._index is None:
+            self._build()
+        n = len(self.paths)
+        for begin in (start + 1, 0):
+            if begin <= n:
+                i = self._find(begin)
+                if i < n and i != start:
+                    return i
+        return None
+
+
+# ============================================
+# Packed dataset output
+# ============================================
+
+PACKED_DIR = "packed"  # Packed shards live in OUTPUT_DIR/packed/<W>x<H>/
+
+# One fixed-size index row per packed crop
+PACKED_INDEX_DTYPE = [
+    ("code", "<u2"),          # Line number in codes.txt
+    ("image", "<u4"),         # Line number in images.txt
+    ("kind", "u1"),           # 0 = box, 1 = polygon
+    ("bbox", "<i4", (4,)),    # x1, y1, x2, y2 in source image pixels
+    ("geom_offset", "<u8"),   # First vertex in the shard's .geom file
+    ("geom_count", "<u4"),    # Number of vertices (2 for boxes: the bbox corners)
+    ("annotation", "<i8"),    # Annotation database id (-1 if unknown)
+]
+PACKED_KINDS = ["box", "polygon"]
+
+
+def packed_location(size, shard, row):
+    """Database reference to a packed record: '<W>x<H>/<shard>/<row>' below PACKED_DIR"""
+    return f"{size[0]}x{size[1]}/{shard:05d}/{row}"
+
+
+class PackedCropWriter:
+    """Append crops to sharded raw files of fixed-shape uint8 RGBA arrays
+
+    Each shard is a .bin file of consecutive H x W x 4 records (memory-
+    mappable as one array), a .idx file of PACKED_INDEX_DTYPE rows and a
+    .geom file of int32 vertex pairs. Codes and source images are interned
+    in append-only text tables. Data is written before its index row, so a
+    crash can only leave unindexed bytes at the end of a shard. Shards
+    rotate once they reach max_shard_bytes.
+    """
+
+    def __init__(self, output_dir, size, max_shard_bytes=1024 * 1024 * 1024):
+        self.width, self.height = size
+        self.root = os.path.join(output_dir, PACKED_DIR, f"{self.width}x{self.height}")
+        self.record_bytes = self.width * self.height * 4
+        self.max_shard_bytes = max(max_shard_bytes, self.record_bytes)
+        self.index_dtype = np.dtype(PACKED_INDEX_DTYPE)
+        os.makedirs(self.root, exist_ok=True)
+
+        meta_path = os.path.join(self.root, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"shape": [self.height, self.width, 4], "dtype": "uint8",
+                           "index_dtype": [list(field) for field in PACKED_INDEX_DTYPE]}, f, indent=2)
+
+        self.codes = self._load_table("codes.txt")
+        self.images = self._load_table("images.txt")
+
+        # Continue the last shard unless it is full
+        shards = sorted(f for f in os.listdir(self.root) if f.endswith(".idx"))
+        self.shard = int(shards[-1][6:11]) if shards else 0
+        if self._shard_size() + self.record_bytes > self.max_shard_bytes:
+            self.shard += 1
+
+    def _load_table(self, name):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return {line.rstrip("\n"): i for i, line in enumerate(f)}
+
+    def _intern(self, table, name, value):
+        if value not in table:
+            with open(os.path.join(self.root, name), "a", encoding="utf-8") as f:
+                f.write(value + "\n")
+            table[value] = len(table)
+        return table[value]
+
+    def _shard_path(self, ext):
+        return os.path.join(self.root, f"shard_{self.shard:05d}.{ext}")
+
+    def _shard_size(self):
+        """Bytes of indexed records in the current shard"""
+        idx_path = self._shard_path("idx")
+        if not os.path.exists(idx_path):
+            return 0
+        return os.path.getsize(idx_path) // self.index_dtype.itemsize * self.record_bytes
+
+    def append(self, crop_img, code, image_path, kind, geometry, annotation_id=-1):
+        """Append one crop (PIL image of the shard size); returns (shard, row)"""
+        size = self._shard_size()
+        if size + self.record_bytes > self.max_shard_bytes:
+            self.shard += 1
+            size = 0
+        row = size // self.record_bytes
+
+        pixels = np.asarray(crop_img.convert("RGBA"), dtype=np.uint8)
+        if pixels.shape != (self.height, self.width, 4):
+            raise ValueError(f"crop shape {pixels.shape} does not match shard shape {(self.height, self.width, 4)}")
+
+        if kind == "box":
+            x, y, w, h = geometry
+            vertices = np.array([[x, y], [x + w, y + h]], dtype="<i4")
+        else:
+            vertices = np.asarray(geometry, dtype="<i4").reshape(-1, 2)
+        x1, y1 = vertices.min(axis=0)
+        x2, y2 = vertices.max(axis=0)
+
+        # Records go to a fixed offset so a torn previous write is overwritten
+        with open(self._shard_path("bin"), "ab") as f:
+            f.truncate(size)
+            f.write(pixels.tobytes())
+        geom_path = self._shard_path("geom")
+        with open(geom_path, "ab") as f:
+            geom_offset = f.tell() // 8
+            f.write(vertices.tobytes())
+
+        entry = np.zeros(1, dtype=self.index_dtype)
+        entry["code"] = self._intern(self.codes, "codes.txt", code)
+        entry["image"] = self._intern(self.images, "images.txt", image_path)
+        entry["kind"] = PACKED_KINDS.index(kind)
+        entry["bbox"] = (x1, y1, x2, y2)
+        entry["geom_offset"] = geom_offset
+        entry["geom_count"] = len(vertices)
+        entry["annotation"] = annotation_id
+        with open(self._shard_path("idx"), "ab") as f:
+            f.write(entry.tobytes())
+        return self.shard, row
+
+
+class PackedCropReader:
+    """Zero-copy access to packed crops through one memory map per shard"""
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.shape = tuple(meta["shape"])
+        index_dtype = np.dtype([tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ()) for field in meta["index_dtype"]])
+        with open(os.path.join(root, "codes.txt"), encoding="utf-8") as f:
+            self.codes = [line.rstrip("\n") for line in f]
+        with open(os.path.join(root, "images.txt"), encoding="utf-8") as f:
+            self.images = [line.rstrip("\n") for line in f]
+
+        self.shards = []
+        for name in sorted(f for f in os.listdir(root) if f.endswith(".idx")):
+            base = os.path.join(root, name[:-4])
+            index = np.fromfile(base + ".idx", dtype=index_dtype)
+            if not len(index):
+                continue
+            pixels = np.memmap(base + ".bin", dtype=np.uint8, mode="r", shape=(len(index),) + self.shape)
+            self.shards.append((pixels, index, base + ".geom"))
+        self.offsets = np.cumsum([0] + [len(index) for _, index, _ in self.shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i):
+        """Return (pixels view, metadata dict) of record i"""
+        if i < 0:
+            i += len(self)
+        shard = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        pixels, index, geom_path = self.shards[shard]
+        row = i - int(self.offsets[shard])
+        entry = index[row]
+        vertices = np.fromfile(geom_path, dtype="<i4", count=int(entry["geom_count"]) * 2,
+                               offset=int(entry["geom_offset"]) * 8).reshape(-1, 2)
+        return pixels[row], {
+            "code": self.codes[entry["code"]],
+            "image": self.images[entry["image"]],
+            "kind": PACKED_KINDS[entry["kind"]],
+            "bbox": tuple(int(v) for v in entry["bbox"]),
+            "geometry": vertices.tolist(),
+            "annotation": int(entry["annotation"]),
+        }
+
+
+# ============================================
+# Background crop saving
+# ============================================
+
+class SaveBatch:
+    """Progress of one save request (all annotations saved with one code)"""
+
+    def __init__(self, label, total):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.duplicates = 0  # Done, but identical to a crop already stored
+
+    @property
+    def finished(self):
+        return self.done + self.failed >= self.total
+
+
+class SaveJob:
+    """One annotation to crop and write
+
+    `save_path` is the name stem: the worker inserts the crop's content
+    hash before the extension.
+    """
+
+    def __init__(self, image, image_path, kind, geometry, code, save_path, size, annotation_id):
+        self.image = image
+        self.image_path = image_path
+        self.kind = kind
+        self.geometry = geometry
+        self.code = code
+        self.save_path = save_path
+        self.size = size
+        self.annotation_id = annotation_id
+
+
+NEAR_DUPLICATE_BITS = 6  # Perceptual hashes this close (of overlapping regions) count as the same crop
+NEAR_DUPLICATE_IOU = 0.5
+
+
+def perceptual_hash(crop_img):
+    """64-bit difference hash of a crop, as a signed integer for SQLite
+
+    Each bit tells whether a pixel of a 9x8 grayscale thumbnail is
+    brighter than its left neighbour, so re-drawing the same region a few
+    pixels off changes only a few bits.
+    """
+    small = np.asarray(crop_img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return int(np.packbits(small[:, 1:] > small[:, :-1]).view(">i8")[0])
+
+
+HASH_SUFFIX = re.compile(r"_[0-9a-f]{12}$")  # Content hash part of a crop file name
+
+
+def content_addressed_path(path, content_hash):
+    """`path` with its stem ending in the first 12 hex digits of content_hash (replacing an older hash)"""
+    stem, ext = os.path.splitext(path)
+    return f"{HASH_SUFFIX.sub('', stem)}_{content_hash[:12]}{ext}"
+
+
+def hamming_distances(phashes, phash):
+    """Number of differing bits between each of `phashes` and `phash`"""
+    xor = np.bitwise_xor(np.asarray(phashes, dtype=">i8"), np.array(phash, dtype=">i8"))
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class CropSaveWorker:
+    """Crop, resize, encode and write annotations on a background thread
+
+    Jobs are processed by a single thread in submission order, so output is
+    deterministic. The queue is bounded: submitting blocks briefly if the
+    worker falls far behind. Each written crop is recorded in the
+    annotation database so crops can be regenerated later without the GUI.
+    Depending on `output_format` crops are written as PNG files, appended
+    to packed shards, or both. With a CodeSuggestionIndex every written
+    crop is also added to it.
+
+    Output is content-addressed: each crop is encoded first and its SHA-1
+    becomes part of its file name, so different crops never overwrite
+    each other. A crop already stored under the same code, byte for byte
+    or as a near-duplicate (same source image, overlapping region, close
+    perceptual hash), is not written again; its annotation points to the
+    stored file instead. Saving is therefore idempotent.
+    """
+
+    def __init__(self, db, output_dir, output_format="png", max_queued=256, suggestions=None):
+        self.db = db
+        self.suggestions = suggestions
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.packed_writers = {}  # Crop size -> PackedCropWriter
+        self.jobs = queue.Queue(maxsize=max_queued)
+        self.created_dirs = set()  # Category folders are created on first write
+        self.batches = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="crop-saver", daemon=True)
+        self._thread.start()
+
+    def submit(self, label, jobs):
+        """Queue SaveJobs as one batch"""
+        batch = SaveBatch(label, len(jobs))
+        with self._lock:
+            self.batches.append(batch)
+        for job in jobs:
+            self.jobs.put((batch, job))
+        return batch
+
+    def find_duplicate(self, job, content_hash, phash):
+        """The stored crop that `job` would duplicate, or None"""
+        stored = self.db.find_crop(content_hash, job.code)
+        if stored is not None:
+            return stored
+        candidates = self.db.crops_for_image(job.image_path, job.code)
+        if not candidates:
+            return None
+        if job.kind == "box":
+            x, y, w, h = job.geometry
+            bounds = (x, y, x + w, y + h)
+        else:
+            xs = [p[0] for p in job.geometry]
+            ys = [p[1] for p in job.geometry]
+            bounds = (min(xs), min(ys), max(xs), max(ys))
+        close = hamming_distances([row["phash"] for row in candidates], phash) <= NEAR_DUPLICATE_BITS
+        overlap = box_iou(bounds, [(row["x1"], row["y1"], row["x2"], row["y2"]) for row in candidates])[0]
+        matches = np.nonzero(close & (overlap >= NEAR_DUPLICATE_IOU))[0]
+        return candidates[int(matches[0])] if len(matches) else None
+
+    def _run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                self.jobs.task_done()
+                return
+            batch, job = item
+            try:
+                with TRACER.span("render crop", kind=job.kind):
+                    crop_img = render_crop(job.image, job.kind, job.geometry, job.size)
+                if crop_img is None:
+                    raise ValueError("empty crop")
+                encoded = io.BytesIO()
+                with TRACER.span("encode crop"):
+                    crop_img.save(encoded, format="PNG")
+                data = encoded.getvalue()
+                content_hash = hashlib.sha1(data).hexdigest()
+                phash = perceptual_hash(crop_img)
+                
+                duplicate = self.find_duplicate(job, content_hash, phash)
+                if duplicate is not None:
+                    self.db.mark_saved(job.annotation_id, duplicate["output"], duplicate["packed"])
+                    print(f"Skipped {job.kind} {job.geometry}: already saved as "
+                          f"{duplicate['output'] or duplicate['packed']}")
+                    with self._lock:
+                        batch.done += 1
+                        batch.duplicates += 1
+                    continue
+                
+                save_path = content_addressed_path(job.save_path, content_hash)
+                output = packed = None
+                if self.output_format in ("png", "both"):
+                    save_dir = os.path.dirname(save_path)
+                    if save_dir not in self.created_dirs:
+                        os.makedirs(save_dir, exist_ok=True)
+                        self.created_dirs.add(save_dir)
+                    with open(save_path, "wb") as f:
+                        f.write(data)
+                    print(f"Saved {job.kind} {job.geometry} -> {save_path}")
+                    output = os.path.relpath(save_path, self.output_dir)
+                if self.output_format in ("packed", "both"):
+                    writer = self.packed_writers.get(job.size)
+                    if writer is None:
+                        writer = self.packed_writers[job.size] = PackedCropWriter(self.output_dir, job.size)
+                    shard, row = writer.append(crop_img, job.code, job.image_path, job.kind, job.geometry,
+                                               job.annotation_id)
+                    print(f"Packed {job.kind} {job.geometry} -> shard {shard} record {row}")
+                    packed = packed_location(job.size, shard, row)
+                self.db.mark_saved(job.annotation_id, output, packed)
+                self.db.add_crop(content_hash, job.code, phash, job.image_path, job.kind, job.geometry, output,
+                                 job.annotation_id, packed)
+                if self.suggestions is not None:
+                    try:
+                        self.suggestions.add([crop_img], [job.code], [job.annotation_id])
+                    except Exception as e:
+                        print(f"Failed to index {save_path} for suggestions: {e}")
+                with self._lock:
+                    batch.done += 1
+            except Exception as e:
+                print(f"Failed to save {job.save_path}: {e}")
+                with self._lock:
+                    batch.failed += 1
+            finally:
+                self.jobs.task_done()
+
+    def pending(self):
+        """Number of jobs not yet written"""
+        with self._lock:
+            return sum(b.total - b.done - b.failed for b in self.batches)
+
+    def pop_finished(self):
+        """Remove and return batches that have completed"""
+        with self._lock:
+            finished = [b for b in self.batches if b.finished]
+            self.batches = [b for b in self.batches if not b.finished]
+            return finished
+
+    def flush(self):
+        """Block until every queued job has been written"""
+        self.jobs.join()
+
+    def close(self):
+        """Flush outstanding jobs and stop the worker thread"""
+        self.jobs.put(None)
+        self._thread.join()
+
+
+# ============================================
+# Background image decoding
+# ============================================
+
+@traced()
+def decode_image(path):
+    """Decode an image file to an RGB array (None if it cannot be read)"""
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    # Convert in place so a large image is not held twice
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+
+PREVIEW_EXTENSIONS = ('.jpg', '.jpeg')  # Formats whose decoder can skip resolution (DCT scaling)
+
+
+def jpeg_size(path):
+    """(width, height) from a JPEG's frame header, without decoding (None if not found)
+
+    PIL would do, but refuses to open walls above its decompression-bomb limit.
+    """
+    try:
+        with open(path, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                length = int.from_bytes(f.read(2), "big")
+                # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    header = f.read(5)
+                    return int.from_bytes(header[3:5], "big"), int.from_bytes(header[1:3], "big")
+                f.seek(length - 2, os.SEEK_CUR)
+    except OSError:
+        return None
+
+
+def decode_preview(path, min_side=1024):
+    """Decode a 1/8, 1/4 or 1/2 scale RGB version of a large JPEG for a quick first paint
+
+    Picks the smallest reduction whose longest side is still at least
+    `min_side`. Returns (preview, (h, w)) with the full-resolution shape, or
+    None when the file is small, not a JPEG or unreadable.
+    """
+    if not path.lower().endswith(PREVIEW_EXTENSIONS):
+        return None
+    size = jpeg_size(path)
+    if size is None:
+        return None
+    w, h = size
+
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if max(w, h) // factor < min_side:
+            continue
+        img = cv2.imread(path, flag)
+        if img is None:
+            return None
+        # imread applies EXIF orientation, the header size does not
+        if (img.shape[1] > img.shape[0]) != (w > h):
+            w, h = h, w
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB), (h, w)
+    return None
+
+
+def user_cache_dir():
+    """Per-user cache folder of the annotator, outside any dataset"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "hieroglyph_annotator")
+
+
+def file_digest(path):
+    """SHA-1 of an image's absolute path, size and mtime; changes whenever the file does"""
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class PreviewCache:
+    """Small JPEG previews of large images, stored on disk for an instant first paint
+
+    Files are named after file_digest (so a changed image misses) plus the
+    full-resolution size the preview stands in for. The directory is listed
+    once; writes go through a temporary file so a crash never leaves a
+    truncated preview. File mtimes record use; once the previews exceed
+    max_bytes (0 means no cap) the least recently used are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=0, max_side=2048):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.entries = {}  # digest -> file name
+        self.total = 0  # Bytes of all previews
+        self._lock = threading.Lock()
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                if entry.name.endswith(".jpg") and not entry.name.endswith(".tmp.jpg"):
+                    self.entries[entry.name.split("_")[0]] = entry.name
+                    self.total += entry.stat().st_size
+
+    def get(self, path):
+        """Return (preview, (h, w)) for an image, or None if there is no current preview"""
+        try:
+            name = self.entries.get(file_digest(path))
+        except OSError:
+            return None
+        if name is None:
+            return None
+        preview_path = os.path.join(self.directory, name)
+        img = cv2.imread(preview_path)
+        if img is None:
+            return None
+        try:
+            os.utime(preview_path)  # Mark as recently used
+        except OSError:
+            pass
+        w, h = (int(v) for v in os.path.splitext(name)[0].split("_")[1].split("x"))
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB), (h, w)
+
+    def put(self, path, image):
+        """Store a preview of a decoded RGB image if it is large enough to need one"""
+        h, w = image.shape[:2]
+        if max(w, h) <= 2 * self.max_side:
+            return
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return
+        if digest in self.entries:
+            return
+        scale = self.max_side / max(w, h)
+        preview = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                             interpolation=cv2.INTER_AREA)
+        name = f"{digest}_{w}x{h}.jpg"
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, name + ".tmp.jpg")
+        if cv2.imwrite(tmp_path, cv2.cvtColor(preview, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90]):
+            os.replace(tmp_path, os.path.join(self.directory, name))
+            with self._lock:
+                self.entries[digest] = name
+                self.total += os.path.getsize(os.path.join(self.directory, name))
+            self.evict(keep=digest)
+
+    def evict(self, keep=None):
+        """Delete least recently used previews until under max_bytes"""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            if self.total <= self.max_bytes:
+                return
+            used = []
+            for digest, name in self.entries.items():
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                used.append((st.st_mtime, digest, name, st.st_size))
+            for _, digest, name, size in sorted(used):
+                if self.total <= self.max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue  # Still open elsewhere (Windows); retried on the next put
+                del self.entries[digest]
+                self.total -= size
+
+
+class RawImageCache:
+    """Decoded images stored as raw .npy files on disk and opened as read-only memory maps
+
+    Revisiting an image maps its file instead of decoding the JPEG again,
+    and crops read only the pages they cover. Files are named after
+    file_digest, so an edited image misses. File mtimes record use; once
+    the directory exceeds max_bytes (0 means no cap) the least recently
+    used images are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, path):
+        return os.path.join(self.directory, file_digest(path) + ".npy")
+
+    def open(self, path):
+        """Memory-map the cached pixels of an image, or None if they are not cached"""
+        try:
+            raw_path = self.path_for(path)
+            image = np.load(raw_path, mmap_mode="r")
+            os.utime(raw_path)  # Mark as recently used
+            return image
+        except (OSError, ValueError):
+            return None
+
+    def load(self, path):
+        """Decoded RGB pixels: memory-mapped from the cache, or decoded and added to it
+
+        Writes a file as large as the decoded image, so call it from a worker thread.
+        """
+        image = self.open(path)
+        if image is not None:
+            return image
+        image = decode_image(path)
+        if image is not None:
+            try:
+                self.store(path, image)
+            except OSError as e:
+                print(f"Could not cache decoded image {path}: {e}")
+        return image
+
+    @staticmethod
+    def _write(target, image):
+        """Save an array through a temporary file so readers never see a partial file"""
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, image)
+        os.replace(tmp_path, target)
+
+    def store(self, path, image):
+        """Write decoded pixels to the cache and return them memory-mapped"""
+        raw_path = self.path_for(path)
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(raw_path, image)
+        self.evict(keep=os.path.basename(raw_path)[:-len(".npy")])
+        return np.load(raw_path, mmap_mode="r")
+
+    def evict(self, keep=None):
+        """Delete least recently used images (raw file and working copies) until under max_bytes"""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            groups = {}  # digest -> [bytes, last use, files]
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".npy"):
+                    continue
+                st = entry.stat()
+                group = groups.setdefault(entry.name[:40], [0, 0.0, []])
+                group[0] += st.st_size
+                group[1] = max(group[1], st.st_mtime)
+                group[2].append(entry.path)
+
+            total = sum(group[0] for group in groups.values())
+            for digest, (size, used, files) in sorted(groups.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                for file in files:
+                    try:
+                        os.remove(file)
+                    except OSError:
+                        pass  # Still open elsewhere (Windows); retried on the next store
+                total -= size
+
+    def load_working_copy(self, path, max_bytes):
+        """Return a working copy of an image within max_bytes, caching it and the full pixels
+
+        Working copies are cached per budget next to the raw file, so a revisit
+        reads a small file instead of downsampling the full image again.
+        """
+        try:
+            raw_path = self.path_for(path)
+        except OSError:
+            return None
+        working_path = raw_path[:-len(".npy")] + f"_{max_bytes >> 20}mb.npy"
+        full = self.open(path)
+        if full is not None and os.path.exists(working_path):
+            try:
+                working = np.load(working_path)
+                os.utime(working_path)
+                return working
+            except (OSError, ValueError):
+                pass
+
+        if full is None:
+            full = decode_image(path)
+            if full is None:
+                return None
+            self.store(path, full)
+        working = working_copy(full, max_bytes)
+        if working is full:
+            return np.array(full)  # Small enough to hold whole
+        self._write(working_path, working)
+        return working
+
+
+class ImagePrefetcher:
+    """Decode neighbouring images ahead of time into a shared ByteLRUCache
+
+    Only the Tk thread calls into this class; the worker threads run
+    the decoder and never touch the GUI. The decoder always runs on a
+    worker, so it may write disk caches without stalling the interface.
+    """
+
+    def __init__(self, cache, workers=2, previews=None, decoder=decode_image):
+        self.cache = cache
+        self.previews = previews  # Optional PreviewCache filled as images are decoded
+        self.decoder = decoder  # path -> RGB array (or None)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.pending = {}  # path -> Future
+        self.wanted = set()
+        self._lock = threading.Lock()
+
+    def _decode(self, path):
+        img = self.decoder(path)
+        if img is not None and self.previews is not None:
+            self.previews.put(path, img)
+        with self._lock:
+            # Results nobody wants any more are dropped instead of evicting useful entries
+            if img is not None and path in self.wanted:
+                self.cache.put(path, img)
+            self.pending.pop(path, None)
+        return img
+
+    def get(self, path):
+        """Return the decoded image, waiting for its decode on a worker"""
+        img = self.cache.get(path)
+        if img is not None:
+            return img
+
+        with self._lock:
+            self.wanted.add(path)
+            # Queued neighbours would run first; the next schedule() queues them again
+            for other, future in list(self.pending.items()):
+                if other != path and future.cancel():
+                    del self.pending[other]
+            future = self.pending.get(path)
+            if future is None:
+                future = self.pending[path] = self.executor.submit(self._decode, path)
+        return future.result()
+
+    def get_async(self, path):
+        """Return a Future for the decoded image, reusing the cache or an in-flight decode"""
+        with self._lock:
+            self.wanted.add(path)
+            img = self.cache.get(path)
+            if img is not None:
+                future = Future()
+                future.set_result(img)
+                return future
+            if path not in self.pending:
+                self.pending[path] = self.executor.submit(self._decode, path)
+            return self.pending[path]
+
+    def schedule(self, paths):
+        """Prefetch `paths` (nearest first) and cancel queued decodes that are not among them"""
+        with self._lock:
+            self.wanted = set(paths)
+            for path, future in list(self.pending.items()):
+                if path not in self.wanted and future.cancel():
+                    del self.pending[path]
+
+            for path in paths:
+                if path in self.pending or path in self.cache:
+                    continue
+                self.pending[path] = self.executor.submit(self._decode, path)
+
+    def shutdown(self):
+        """Cancel queued decodes and stop the workers"""
+        with self._lock:
+            self.wanted = set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================
+# Memory budget mode
+# ============================================
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where it cannot be measured)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def working_copy(image, max_bytes):
+    """Downsample an image (INTER_AREA) so it fits in max_bytes; small images are returned as is"""
+    if image.nbytes <= max_bytes:
+        return image
+    h, w = image.shape[:2]
+    scale = (image.nbytes / max_bytes) ** 0.5
+    size = (max(1, int(w / scale)), max(1, int(h / scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+# ============================================
+# Annotation geometry store
+# ============================================
+
+class AnnotationStore:
+    """The annotations of one image in compact arrays, all geometry in image coordinates
+
+    Each annotation is a row with its kind, bounding box, database id and the
+    (start, count) of its vertices in one shared vertex array; a box stores
+    its top-left and bottom-right corners. Transforms to and from the canvas,
+    clipping to the image and hit-testing work on every annotation at once.
+    Removed rows are only marked dead so indices (and labels) stay stable.
+    The arrays are allocated on first use, so creating a store does not
+    import numpy.
+    """
+
+    BOX = 0
+    POLYGON = 1
+    KIND_NAMES = ("box", "polygon")
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.count = 0
+        self.kinds = None  # Allocated by _allocate
+        self.num_vertices = 0
+        self.kind_totals = [0, 0]
+
+    def _allocate(self):
+        capacity = self.capacity
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.bounds = np.zeros((capacity, 4), dtype=np.int32)   # x1, y1, x2, y2
+        self.ids = np.full(capacity, -1, dtype=np.int64)        # Annotation database ids
+        self.ordinals = np.zeros(capacity, dtype=np.int32)      # Position among annotations of the same kind
+        self.vertex_start = np.zeros(capacity, dtype=np.int64)
+        self.vertex_count = np.zeros(capacity, dtype=np.int32)
+        self.vertices = np.zeros((capacity * 4, 2), dtype=np.int32)
+
+    def __len__(self):
+        return int(self.alive[:self.count].sum()) if self.count else 0
+
+    def _grow(self, rows, vertices):
+        """Double the row and vertex arrays until they fit"""
+        if self.kinds is None:
+            self._allocate()
+        capacity = len(self.kinds)
+        if self.count + rows > capacity:
+            new_capacity = max(capacity * 2, self.count + rows)
+            for name in ("kinds", "alive", "bounds", "ids", "ordinals", "vertex_start", "vertex_count"):
+                old = getattr(self, name)
+                grown = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[:capacity] = old
+                setattr(self, name, grown)
+        if self.num_vertices + vertices > len(self.vertices):
+            grown = np.zeros((max(len(self.vertices) * 2, self.num_vertices + vertices), 2), dtype=np.int32)
+            grown[:self.num_vertices] = self.vertices[:self.num_vertices]
+            self.vertices = grown
+
+    def add(self, kind, geometry, annotation_id=-1):
+        """Append a box (x, y, w, h) or polygon [(x, y), ...]; returns its index"""
+        if kind == "box":
+            x, y, w, h = geometry
+            points = np.array([[x, y], [x + w, y + h]], dtype=np.int32)
+        else:
+            points = np.asarray(geometry, dtype=np.int32).reshape(-1, 2)
+        self._grow(1, len(points))
+
+        i = self.count
+        code = self.KIND_NAMES.index(kind)
+        self.kinds[i] = code
+        self.alive[i] = True
+        self.bounds[i] = (*points.min(axis=0), *points.max(axis=0))
+        self.ids[i] = annotation_id
+        self.ordinals[i] = self.kind_totals[code]
+        self.kind_totals[code] += 1
+        self.vertex_start[i] = self.num_vertices
+        self.vertex_count[i] = len(points)
+        self.vertices[self.num_vertices:self.num_vertices + len(points)] = points
+        self.num_vertices += len(points)
+        self.count += 1
+        return i
+
+    def remove(self, index):
+        """Mark an annotation as removed"""
+        self.alive[index] = False
+
+    def clear(self):
+        """Remove all annotations, keeping the allocated arrays"""
+        if self.kinds is not None:
+            self.alive[:self.count] = False
+        self.count = 0
+        self.num_vertices = 0
+        self.kind_totals = [0, 0]
+
+    def indices(self, kind=None):
+        """Indices of live annotations, optionally of one kind, in drawing order"""
+        self._grow(0, 0)
+        mask = self.alive[:self.count].copy()
+        if kind is not None:
+            mask &= self.kinds[:self.count] == self.KIND_NAMES.index(kind)
+        return np.flatnonzero(mask)
+
+    def kind(self, index):
+        return self.KIND_NAMES[self.kinds[index]]
+
+    def label(self, index):
+        """Canvas label: 1, 2, ... for boxes and P1, P2, ... for polygons"""
+        number = int(self.ordinals[index]) + 1
+        return str(number) if self.kinds[index] == self.BOX else f"P{number}"
+
+    def points(self, index):
+        """Vertex array of one annotation"""
+        start = self.vertex_start[index]
+        return self.vertices[start:start + self.vertex_count[index]]
+
+    def geometry(self, index):
+        """Geometry in the form used by the database and crop functions"""
+        points = self.points(index)
+        if self.kinds[index] == self.BOX:
+            (x1, y1), (x2, y2) = points.tolist()
+            return (x1, y1, x2 - x1, y2 - y1)
+        return [tuple(point) for point in points.tolist()]
+
+    def vertex_rows(self, indices):
+        """Rows of the vertex array belonging to the given annotations, concatenated"""
+        counts = self.vertex_count[indices]
+        starts = np.repeat(self.vertex_start[indices], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return starts + within
+
+    @staticmethod
+    def to_canvas(points, zoom, offset_x, offset_y):
+        """Image coordinates to canvas coordinates for an (N, 2) array"""
+        return (points * zoom - (offset_x, offset_y)).astype(np.int64)
+
+    @staticmethod
+    def from_canvas(points, zoom, offset_x, offset_y):
+        """Canvas coordinates to image coordinates for an (N, 2) array"""
+        return ((np.asarray(points) + (offset_x, offset_y)) / zoom).astype(np.int64)
+
+    def clipped_bounds(self, img_w, img_h):
+        """Bounds of every live annotation clipped to the image, and a mask of the non-empty ones"""
+        indices = self.indices()
+        clipped = np.clip(self.bounds[indices], 0, (img_w, img_h, img_w, img_h))
+        valid = (clipped[:, 2] > clipped[:, 0]) & (clipped[:, 3] > clipped[:, 1])
+        return indices, clipped, valid
+
+    def query(self, x1, y1, x2, y2, candidates=None):
+        """Live annotations whose bounds intersect an image-space rectangle"""
+        self._grow(0, 0)
+        if candidates is None:
+            candidates = self.indices()
+        else:
+            candidates = np.asarray(candidates, dtype=np.int64)
+            candidates = candidates[self.alive[candidates]]
+        b = self.bounds[candidates]
+        hit = (b[:, 2] >= x1) & (b[:, 0] <= x2) & (b[:, 3] >= y1) & (b[:, 1] <= y2)
+        return candidates[hit]
+
+    def hit_test(self, x, y):
+        """Live annotations containing an image point, most recently drawn first"""
+        candidates = self.query(x, y, x, y)
+        hits = [int(i) for i in candidates[::-1]
+                if self.kinds[i] == self.BOX
+                or cv2.pointPolygonTest(self.points(i).reshape(-1, 1, 2), (float(x), float(y)), False) >= 0]
+        return hits
+
+
+# ============================================
+# Annotation overlay
+# ============================================
+
+class AnnotationOverlay:
+    """Retained canvas items for annotations, culled with a uniform grid
+
+    Every annotation keeps its canvas items for as long as it exists; a
+    redraw only moves (canvas.coords) the items of annotations intersecting
+    the viewport and hides the ones that left it. The grid indexes
+    annotation bounds in image space, so a redraw costs O(visible) rather
+    than O(all annotations).
+    """
+
+    CELL_SIZE = 512  # Grid cell size in image pixels
+
+    def __init__(self, canvas, store, color='#00FF00', dash=None, labels=True):
+        self.canvas = canvas
+        self.store = store
+        self.color = color
+        self.dash = dash  # Tk dash pattern, e.g. (4, 4) for ghost boxes
+        self.labels = labels
+        self.items = {}    # index -> (shape item[, text item]), created when first visible
+        self.grid = {}     # (cell x, cell y) -> store indices of annotations overlapping the cell
+        self.visible = set()
+
+    def _cells(self, x1, y1, x2, y2):
+        c = self.CELL_SIZE
+        for cy in range(int(y1 // c), int(y2 // c) + 1):
+            for cx in range(int(x1 // c), int(x2 // c) + 1):
+                yield cx, cy
+
+    def add(self, index):
+        """Index an annotation of the store"""
+        for cell in self._cells(*self.store.bounds[index]):
+            self.grid.setdefault(cell, set()).add(index)
+
+    def remove(self, index):
+        """Forget an annotation and delete its canvas items"""
+        for cell in self._cells(*self.store.bounds[index]):
+            self.grid[cell].discard(index)
+        for item in self.items.pop(index, ()):
+            self.canvas.delete(item)
+        self.visible.discard(index)
+
+    def clear(self):
+        """Forget all annotations"""
+        for items in self.items.values():
+            for item in items:
+                self.canvas.delete(item)
+        self.items.clear()
+        self.grid.clear()
+        self.visible.clear()
+
+    def update(self, zoom, offset_x, offset_y, view_w, view_h):
+        """Position the items of visible annotations for the current view"""
+        view = (offset_x / zoom, offset_y / zoom, (offset_x + view_w) / zoom, (offset_y + view_h) / zoom)
+        candidates = set()
+        for cell in self._cells(*view):
+            candidates.update(self.grid.get(cell, ()))
+        indices = self.store.query(*view, candidates=sorted(candidates))
+        visible = set(indices.tolist())
+
+        for index in self.visible - visible:
+            for item in self.items.get(index, ()):
+                self.canvas.itemconfigure(item, state='hidden')
+
+        # Transform the vertices of every visible annotation in one batch
+        rows = self.store.vertex_rows(indices)
+        coords = self.store.to_canvas(self.store.vertices[rows], zoom, offset_x, offset_y).tolist()
+        pos = 0
+        for index in indices.tolist():
+            count = int(self.store.vertex_count[index])
+            points = coords[pos:pos + count]
+            pos += count
+            flat = [v for point in points for v in point]
+            x1, y1 = points[0]
+            items = self.items.get(index)
+            if items is None:
+                style = dict(outline=self.color, width=2)
+                if self.dash:
+                    style["dash"] = self.dash
+                if self.store.kinds[index] == AnnotationStore.BOX:
+                    items = (self.canvas.create_rectangle(*flat, **style),)
+                else:
+                    items = (self.canvas.create_polygon(*flat, fill="", **style),)
+                if self.labels:
+                    items += (self.canvas.create_text(x1 + 5, y1 + 5, text=self.store.label(index),
+                                                      fill=self.color, font=('Arial', 12, 'bold')),)
+                self.items[index] = items
+            else:
+                self.canvas.coords(items[0], *flat)
+                if self.labels:
+                    self.canvas.coords(items[1], x1 + 5, y1 + 5)
+                if index not in self.visible:
+                    for item in items:
+                        self.canvas.itemconfigure(item, state='normal')
+        self.visible = visible
+
+
+# ============================================
+# Region proposals
+# ============================================
+
+class ProposalCancelled(Exception):
+    """Raised inside a proposal job when the user has moved on to another image"""
+
+
+def box_iou(a, b):
+    """IoU matrix between (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.3, max_boxes=None):
+    """Greedy NMS: indices of the boxes kept, best first
+
+    Each round keeps the best remaining box and drops everything that
+    overlaps it by more than iou_threshold in one vectorized IoU row.
+    """
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    keep = []
+    while order.size and (max_boxes is None or len(keep) < max_boxes):
+        best = order[0]
+        keep.append(int(best))
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest])[0] <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+@traced()
+def propose_regions(image, scale=1.0, cancel=None, max_side=2048, max_boxes=300):
+    """Candidate glyph boxes (x1, y1, x2, y2) in full-resolution pixels, best first
+
+    `image` may be a reduced copy standing for an image `scale` times
+    larger. It is reduced further to at most max_side pixels, adaptively
+    thresholded (carvings are darker than their local surroundings),
+    closed so strokes of one sign merge, and split into connected
+    components. Components of glyph-like size, aspect and fill are scored
+    and thinned with non-max suppression. `cancel` is a threading.Event
+    checked between stages.
+    """
+    def check():
+        if cancel is not None and cancel.is_set():
+            raise ProposalCancelled()
+
+    h, w = image.shape[:2]
+    factor = min(1.0, max_side / max(h, w))
+    small = cv2.resize(image, (max(1, int(w * factor)), max(1, int(h * factor))),
+                       interpolation=cv2.INTER_AREA) if factor < 1.0 else np.ascontiguousarray(image)
+    check()
+
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    side = min(gray.shape)
+    block = max(15, side // 40) | 1  # Odd neighbourhood of a few glyph strokes
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block, 7)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)))
+    check()
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    stats = stats[1:].astype(np.float64)  # Drop the background
+    x, y, bw, bh, area = stats.T
+    min_size, max_size = max(6, side * 0.01), side * 0.25
+    aspect = bw / np.maximum(bh, 1)
+    fill = area / np.maximum(bw * bh, 1)
+    good = ((bw >= min_size) & (bh >= min_size) & (bw <= max_size) & (bh <= max_size)
+            & (aspect > 1 / 6) & (aspect < 6) & (fill > 0.1) & (fill < 0.9))
+    check()
+
+    # Pad by two pixels, then back to full-resolution coordinates
+    boxes = np.stack([x - 2, y - 2, x + bw + 2, y + bh + 2], axis=1)[good]
+    boxes = np.clip(boxes, 0, [small.shape[1], small.shape[0]] * 2) * (scale / factor)
+    scores = (fill * np.sqrt(area))[good]
+    keep = non_max_suppression(boxes, scores, 0.3, max_boxes)
+    return boxes[keep].astype(np.int64)
+
+
+@traced()
+def find_instances(image, box, scale=1.0, cancel=None, threshold=0.7, scales=(0.8, 0.9, 1.0, 1.12, 1.25),
+                   angles=(0,), template_side=24, max_boxes=300):
+    """Boxes (x1, y1, x2, y2) in full-resolution pixels that look like `box`, with scores, best first
+
+    `box` is in full-resolution pixels and `image` may be a reduced copy
+    standing for an image `scale` times larger. The image is reduced so
+    the template is about template_side pixels across and searched with
+    normalised cross-correlation at every scale (and rotation in degrees)
+    of the template; local maxima above a lowered threshold become
+    candidates. Each candidate is then re-matched in a small window at
+    three times that resolution and kept if it reaches `threshold`.
+    Overlapping matches are thinned with non-max suppression. `cancel` is
+    a threading.Event checked between steps.
+    """
+    def check():
+        if cancel is not None and cancel.is_set():
+            raise ProposalCancelled()
+
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = (int(round(v / scale)) for v in box)
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+    bw, bh = x2 - x1, y2 - y1
+    if bw < 4 or bh < 4:
+        return np.zeros((0, 4), np.int64), np.zeros(0)
+    source = cv2.cvtColor(np.ascontiguousarray(image[y1:y2, x1:x2]), cv2.COLOR_RGB2GRAY)
+
+    def template(factor, size_scale, angle):
+        size = (max(3, int(round(bw * factor * size_scale))), max(3, int(round(bh * factor * size_scale))))
+        result = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        if angle:
+            matrix = cv2.getRotationMatrix2D(((size[0] - 1) / 2, (size[1] - 1) / 2), angle, 1.0)
+            result = cv2.warpAffine(result, matrix, size, borderMode=cv2.BORDER_REPLICATE)
+        return result
+
+    # Coarse pass over the whole (reduced) image
+    coarse = min(1.0, template_side / min(bw, bh))
+    small = cv2.resize(image, (max(1, int(w * coarse)), max(1, int(h * coarse))),
+                       interpolation=cv2.INTER_AREA) if coarse < 1.0 else np.ascontiguousarray(image)
+    small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    check()
+
+    candidates = []  # (x, y, w, h) in image pixels, score, scale, angle
+    for size_scale in scales:
+        for angle in angles:
+            tmpl = template(coarse, size_scale, angle)
+            th, tw = tmpl.shape
+            if th > small.shape[0] or tw > small.shape[1]:
+                continue
+            response = cv2.matchTemplate(small, tmpl, cv2.TM_CCOEFF_NORMED)
+            peaks = cv2.dilate(response, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, tw // 2) | 1, max(3, th // 2) | 1)))
+            ys, xs = np.nonzero((response >= peaks) & (response >= threshold - 0.15))
+            for x, y, score in zip(xs.tolist(), ys.tolist(), response[ys, xs].tolist()):
+                candidates.append(((x / coarse, y / coarse, tw / coarse, th / coarse), score, size_scale, angle))
+            check()
+    if not candidates:
+        return np.zeros((0, 4), np.int64), np.zeros(0)
+    boxes = np.array([[x, y, x + cw, y + ch] for (x, y, cw, ch), _, _, _ in candidates])
+    keep = non_max_suppression(boxes, [c[1] for c in candidates], 0.3, max_boxes * 2)
+
+    # Fine pass: re-match each candidate in a window around it
+    fine = min(1.0, coarse * 3)
+    found, scores = [], []
+    for i in keep.tolist():
+        (cx, cy, cw, ch), _, size_scale, angle = candidates[i]
+        margin_x, margin_y = cw * 0.25 + 2 / coarse, ch * 0.25 + 2 / coarse
+        wx1, wy1 = max(0, int(cx - margin_x)), max(0, int(cy - margin_y))
+        wx2, wy2 = min(w, int(cx + cw + margin_x) + 1), min(h, int(cy + ch + margin_y) + 1)
+        window = np.ascontiguousarray(image[wy1:wy2, wx1:wx2])
+        size = (max(1, int((wx2 - wx1) * fine)), max(1, int((wy2 - wy1) * fine)))
+        window = cv2.cvtColor(cv2.resize(window, size, interpolation=cv2.INTER_AREA) if fine < 1.0 else window,
+                              cv2.COLOR_RGB2GRAY)
+        tmpl = template(fine, size_scale, angle)
+        th, tw = tmpl.shape
+        if th > window.shape[0] or tw > window.shape[1]:
+            continue
+        _, score, _, (mx, my) = cv2.minMaxLoc(cv2.matchTemplate(window, tmpl, cv2.TM_CCOEFF_NORMED))
+        if score >= threshold:
+            fx, fy = wx1 + mx / fine, wy1 + my / fine
+            found.append([fx, fy, fx + tw / fine, fy + th / fine])
+            scores.append(score)
+        check()
+    if not found:
+        return np.zeros((0, 4), np.int64), np.zeros(0)
+
+    keep = non_max_suppression(found, scores, 0.3, max_boxes)
+    boxes = np.clip(np.array(found)[keep], 0, [w, h, w, h]) * scale
+    return np.round(boxes).astype(np.int64), np.array(scores)[keep]
+
+
+class RegionProposer:
+    """Runs propose_regions (or find_instances) for the current image on one background thread
+
+    Proposals are cached per image path (the CACHE_SIZE most recent
+    images). Any new request cancels the running job through its event,
+    so navigation never waits for a stale proposal or search.
+    """
+
+    CACHE_SIZE = 64
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="proposals")
+        self.cache = OrderedDict()  # path -> boxes
+        self.cancel_event = None
+        self.future = None
+        self._lock = threading.Lock()
+
+    def _run(self, path, image, scale, cancel):
+        try:
+            boxes = propose_regions(image, scale, cancel)
+        except ProposalCancelled:
+            return None
+        with self._lock:
+            self.cache[path] = boxes
+            self.cache.move_to_end(path)
+            while len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return boxes
+
+    def request(self, path, image, scale=1.0):
+        """Future for the proposals of an image, cancelling any other job"""
+        self.cancel()
+        with self._lock:
+            boxes = self.cache.get(path)
+            if boxes is not None:
+                self.cache.move_to_end(path)
+        if boxes is not None:
+            future = Future()
+            future.set_result(boxes)
+            return future
+        self.cancel_event = threading.Event()
+        self.future = self.executor.submit(self._run, path, image, scale, self.cancel_event)
+        return self.future
+
+    def _find(self, image, box, scale, cancel, options):
+        try:
+            return find_instances(image, box, scale, cancel, **options)
+        except ProposalCancelled:
+            return None
+
+    def find(self, image, box, scale=1.0, **options):
+        """Future for (boxes, scores) of the instances of a box, cancelling any other job"""
+        self.cancel()
+        self.cancel_event = threading.Event()
+        self.future = self.executor.submit(self._find, image, box, scale, self.cancel_event, options)
+        return self.future
+
+    def cancel(self):
+        """Stop the running or queued job, if any"""
+        if self.future is not None:
+            self.future.cancel()
+            self.cancel_event.set()
+            self.future = None
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================
+# Code suggestions
+# ============================================
+
+SUGGEST_DIR = ".suggest"  # Feature index of saved crops, inside OUTPUT_DIR
+SUGGEST_FEATURE_VERSION = 1  # Bump when crop_features changes; older indexes are rebuilt once
+SUGGEST_THUMB = 32  # Crops are described at this many pixels square
+SUGGEST_CELL = 8  # Orientation histogram cell size within the thumbnail
+SUGGEST_BINS = 9  # Unsigned gradient orientations per cell
+SUGGEST_FEATURE_DIM = (SUGGEST_THUMB // SUGGEST_CELL) ** 2 * SUGGEST_BINS + 64
+
+
+def crop_features(crops):
+    """(N, SUGGEST_FEATURE_DIM) float32 unit rows describing PIL crops
+
+    Each crop becomes a 32x32 grayscale thumbnail. Its gradient
+    orientation histograms per 8x8 cell (HOG without block overlap)
+    capture stroke shape, and its 8x8 mean-free pixels capture the coarse
+    layout. Both halves are normalised separately, so cosine similarity is
+    a plain dot product. All crops are processed as one batch.
+    """
+    size, cell, bins = SUGGEST_THUMB, SUGGEST_CELL, SUGGEST_BINS
+    if not len(crops):
+        return np.zeros((0, SUGGEST_FEATURE_DIM), np.float32)
+    thumbs = np.stack([cv2.resize(np.asarray(crop.convert("L")), (size, size), interpolation=cv2.INTER_AREA)
+                       for crop in crops]).astype(np.float32)
+    n = len(thumbs)
+
+    # Central differences, orientation folded into [0, pi)
+    padded = np.pad(thumbs, ((0, 0), (1, 1), (1, 1)), mode="edge")
+    gx = padded[:, 1:-1, 2:] - padded[:, 1:-1, :-2]
+    gy = padded[:, 2:, 1:-1] - padded[:, :-2, 1:-1]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.minimum((np.arctan2(gy, gx) % np.pi) * (bins / np.pi), bins - 1).astype(np.int64)
+
+    # One weighted bincount over (crop, cell row, cell column, bin)
+    cells = size // cell
+    rows = np.arange(size) // cell
+    slot = ((np.arange(n)[:, None, None] * cells + rows[None, :, None]) * cells + rows[None, None, :]) * bins + orientation
+    shape = np.bincount(slot.ravel(), weights=magnitude.ravel(), minlength=n * cells * cells * bins)
+    shape = np.sqrt(shape.reshape(n, -1))  # Hellinger-style damping of strong edges
+
+    step = size // 8
+    layout = thumbs.reshape(n, 8, step, 8, step).mean(axis=(2, 4)).reshape(n, 64)
+    layout -= layout.mean(axis=1, keepdims=True)
+
+    def unit(rows):
+        return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-6)
+
+    return (np.hstack([unit(shape), unit(layout)]) / np.sqrt(2)).astype(np.float32)
+
+
+class CodeSuggestionIndex:
+    """Persisted k-NN index from crop features to the Gardiner codes saved for them
+
+    Features live in one append-only float32 file (`features.f32`, one
+    SUGGEST_FEATURE_DIM row per crop) next to `labels.txt` with the code
+    and annotation id of each row. Rows are written before their label, so
+    a crash can only leave an unlabelled row that the next append
+    overwrites. The matrix is read once and then grown in memory as crops
+    are saved; it is only rebuilt when no index exists yet (or its feature
+    version is outdated). Safe to use from the save worker and the Tk
+    thread at the same time.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.features_path = os.path.join(directory, "features.f32")
+        self.labels_path = os.path.join(directory, "labels.txt")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.features = np.zeros((0, SUGGEST_FEATURE_DIM), np.float32)  # Capacity grows by doubling
+        self.count = 0
+        self.codes = []  # Code of each row
+        self.annotation_ids = []  # Annotation database id of each row (-1 for crops saved without one)
+        self.indexed_ids = set()  # Known annotation ids, so no annotation is indexed twice
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def exists(self):
+        """Whether an index with the current feature version is on disk"""
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get("version") == SUGGEST_FEATURE_VERSION and meta.get("dim") == SUGGEST_FEATURE_DIM
+
+    def load(self):
+        """Read the index from disk (once); an outdated or missing index starts empty"""
+        with self._lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            if not self.exists():
+                # Rows of an outdated or interrupted build are dropped; import_saved starts over
+                os.makedirs(self.directory, exist_ok=True)
+                for path in (self.meta_path, self.features_path, self.labels_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
+            labels = []
+            if os.path.exists(self.labels_path):
+                with open(self.labels_path, encoding="utf-8") as f:
+                    labels = [line.rstrip("\n").split("\t") for line in f if line.strip()]
+            features = np.fromfile(self.features_path, dtype=np.float32) if os.path.exists(self.features_path) else []
+            count = min(len(labels), len(features) // SUGGEST_FEATURE_DIM)
+            self.features = np.array(features[:count * SUGGEST_FEATURE_DIM], np.float32).reshape(count, -1)
+            self.codes = [code for code, _ in labels[:count]]
+            self.annotation_ids = [int(annotation_id) for _, annotation_id in labels[:count]]
+            self.indexed_ids = set(self.annotation_ids) - {-1}
+            self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def add(self, crops, codes, annotation_ids):
+        """Append crops (PIL images) saved under `codes`, on disk and in memory
+
+        Crops of annotations that are already indexed are skipped (the save
+        worker and the first-launch import can both see a new save).
+        """
+        features = crop_features(crops)
+        self.load()
+        with self._lock:
+            new = [i for i, annotation_id in enumerate(annotation_ids)
+                   if annotation_id < 0 or annotation_id not in self.indexed_ids]
+            if not new:
+                return
+            features = features[new]
+            codes = [codes[i] for i in new]
+            annotation_ids = [annotation_ids[i] for i in new]
+            self.indexed_ids.update(annotation_ids)
+            self.indexed_ids.discard(-1)
+            with open(self.features_path, "ab") as f:
+                f.truncate(self.count * SUGGEST_FEATURE_DIM * 4)
+                f.write(features.tobytes())
+            with open(self.labels_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{code}\t{annotation_id}\n" for code, annotation_id in zip(codes, annotation_ids))
+            needed = self.count + len(features)
+            if needed > len(self.features):
+                grown = np.zeros((max(needed, 2 * len(self.features), 256), SUGGEST_FEATURE_DIM), np.float32)
+                grown[:self.count] = self.features[:self.count]
+                self.features = grown
+            self.features[self.count:needed] = features
+            self.count = needed
+            self.codes.extend(codes)
+            self.annotation_ids.extend(annotation_ids)
+
+    def suggest(self, crops, k=5, neighbours=15):
+        """Top-k (code, score) pairs for a group of crops that will share one code
+
+        All crops are matched in one matrix product. Each crop's nearest
+        rows vote for their code with their similarity, so a code seen on
+        several close neighbours outranks a single lucky match.
+        """
+        queries = crop_features(crops)
+        self.load()
+        with self._lock:
+            features = self.features[:self.count]
+            codes = self.codes[:self.count]
+        if not len(features) or not len(queries):
+            return []
+        similarity = queries @ features.T
+        neighbours = min(neighbours, len(features))
+        nearest = np.argpartition(-similarity, neighbours - 1, axis=1)[:, :neighbours]
+        votes = {}
+        for row, columns in enumerate(nearest):
+            for column in columns.tolist():
+                score = max(0.0, float(similarity[row, column]))
+                votes[codes[column]] = votes.get(codes[column], 0.0) + score
+        total = sum(votes.values()) or 1.0
+        ranked = sorted(votes.items(), key=lambda item: -item[1])[:k]
+        return [(code, score / total) for code, score in ranked]
+
+    def import_saved(self, db, output_dir, size, batch_size=256):
+        """Build the index from crops saved before it existed
+
+        Crops recorded in the database are read from their PNG file or else
+        from the packed shards; PNG files in the code folders that no
+        database row covers (saved by versions without the database) are
+        indexed under their folder's code.
+
+        The index only counts as existing once this has finished, so an
+        interrupted import is redone from the start on the next launch.
+        """
+        self.load()
+        pending, crops, codes, ids = set(), [], [], []
+        recorded = set()  # Crop files covered by database rows
+
+        def flush():
+            if crops:
+                self.add(crops, codes, ids)
+                crops.clear()
+                codes.clear()
+                ids.clear()
+
+        for row in db.saved_annotations():
+            if row["output"]:
+                recorded.add(os.path.normpath(row["output"]))
+            if not row["output"] or not os.path.exists(os.path.join(output_dir, row["output"])):
+                pending.add(row["id"])
+                continue
+            with Image.open(os.path.join(output_dir, row["output"])) as crop:
+                crops.append(crop.copy())
+            codes.append(row["code"])
+            ids.append(row["id"])
+            if len(crops) >= batch_size:
+                flush()
+
+        packed_root = os.path.join(output_dir, PACKED_DIR, f"{size[0]}x{size[1]}")
+        if pending and os.path.exists(os.path.join(packed_root, "meta.json")):
+            reader = PackedCropReader(packed_root)
+            for i in range(len(reader)):
+                pixels, meta = reader[i]
+                if meta["annotation"] in pending:
+                    pending.discard(meta["annotation"])
+                    crops.append(Image.fromarray(np.array(pixels), "RGBA"))
+                    codes.append(meta["code"])
+                    ids.append(meta["annotation"])
+                    if len(crops) >= batch_size:
+                        flush()
+
+        for code, relative in crop_files(output_dir):
+            if os.path.normpath(relative) in recorded:
+                continue
+            with Image.open(os.path.join(output_dir, relative)) as crop:
+                crops.append(crop.copy())
+            codes.append(code)
+            ids.append(-1)
+            if len(crops) >= batch_size:
+                flush()
+        flush()
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SUGGEST_FEATURE_VERSION, "dim": SUGGEST_FEATURE_DIM}, f)
+        return len(self)
+
+
+# ============================================
+# Image discovery
+# ============================================
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+IMAGE_MANIFEST = ".image_manifest.json"  # Inside the output folder
+
+
+def natural_key(path):
+    """Sort key for a relative path that orders numbers numerically (wall2 before wall10)"""
+    # re.split with a capture group puts the digit runs at the odd positions
+    return tuple(
+        tuple(int(part) if i % 2 else part for i, part in enumerate(re.split(r"(\d+)", component.lower())))
+        for component in path.replace(os.sep, "/").split("/")
+    )
+
+
+class ImageScanner:
+    """Recursive scan of the input folder on a background thread, streamed in batches
+
+    Directories are walked depth-first with os.scandir, files and folders
+    interleaved in natural order, so images arrive in their final order;
+    relative paths are handed to the Tk thread through a queue (a None
+    marks the end). The manifest records every directory's mtime with
+    its images' (name, size, mtime) and its subdirectories, so a restart
+    only lists directories whose mtime changed.
+    """
+
+    def __init__(self, root, manifest_path, batch_size=500):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.batch_size = batch_size
+        self.results = queue.Queue()
+        self.found = 0
+        self.rescanned = 0  # Directories listed because the manifest was missing or stale
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="image-scan", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("root") != os.path.abspath(self.root):
+            return {}
+        return manifest.get("dirs", {})
+
+    def _save_manifest(self, dirs):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"root": os.path.abspath(self.root), "dirs": dirs}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _list_dir(path, mtime):
+        """Images and subdirectories of one directory"""
+        files, dirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    st = entry.stat()
+                    files.append([entry.name, st.st_size, st.st_mtime_ns])
+        return {"mtime": mtime, "files": files, "dirs": dirs}
+
+    def _run(self):
+        old = self._load_manifest()
+        dirs = {}
+        batch = []
+        stack = [(True, "")]  # (is folder, "/"-separated relative path)
+        while stack and not self._stop.is_set():
+            is_dir, rel = stack.pop()
+            if not is_dir:
+                batch.append(rel.replace("/", os.sep))
+                if len(batch) >= self.batch_size:
+                    self.found += len(batch)
+                    self.results.put(batch)
+                    batch = []
+                continue
+
+            path = os.path.join(self.root, *rel.split("/")) if rel else self.root
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                entry = old.get(rel)
+                if entry is None or entry["mtime"] != mtime:
+                    entry = self._list_dir(path, mtime)
+                    self.rescanned += 1
+            except OSError as e:
+                print(f"Skipping unreadable folder {path}: {e}")
+                continue
+            dirs[rel] = entry
+
+            # Push in reverse natural order so children are visited in natural order
+            children = [(False, f[0]) for f in entry["files"]] + [(True, d) for d in entry["dirs"]]
+            children.sort(key=lambda child: natural_key(child[1]), reverse=True)
+            stack.extend((child_is_dir, f"{rel}/{name}" if rel else name) for child_is_dir, name in children)
+
+        if batch:
+            self.found += len(batch)
+            self.results.put(batch)
+        if not self._stop.is_set():
+            try:
+                self._save_manifest(dirs)
+            except OSError as e:
+                print(f"Could not save image manifest: {e}")
+        self.results.put(None)
+
+
+# ============================================
+# Symbol search
+# ============================================
+
+class SymbolSearchIndex:
+    """Precomputed search index over symbol codes and description words
+
+    Every suffix of every code and description token is kept in a sorted
+    list, so a prefix lookup with bisect finds all tokens containing the
+    query text. Tokens are split on whitespace only, so punctuation such as
+    "(var." stays searchable. Multi-word queries match symbols containing
+    all words.
+    Results are returned in catalog order and memoised per query.
+    """
+
+    TOKEN_PATTERN = re.compile(r"\S+")
+
+    def __init__(self, codes, descriptions):
+        self.codes = list(codes)
+        self.labels = []
+        postings = {}
+        for i, code in enumerate(self.codes):
+            description = descriptions.get(code, "Unknown")
+            self.labels.append(f"{i+1:3d}. {code} - {description}")
+            for token in self.TOKEN_PATTERN.findall(f"{code} {description}".lower()):
+                for start in range(len(token)):
+                    postings.setdefault(token[start:], set()).add(i)
+        self.keys = sorted(postings)
+        self.postings = [postings[key] for key in self.keys]
+        self.everything = list(range(len(self.codes)))
+        self._results = OrderedDict()
+
+    def _lookup(self, text):
+        """Indices of symbols with a token containing `text`"""
+        start = bisect.bisect_left(self.keys, text)
+        end = bisect.bisect_left(self.keys, text + "\uffff", lo=start)
+        found = set()
+        for i in range(start, end):
+            found |= self.postings[i]
+        return found
+
+    def search(self, query):
+        """Return the catalog indices matching `query`"""
+        query = query.lower().strip()
+        cached = self._results.get(query)
+        if cached is not None:
+            self._results.move_to_end(query)
+            return cached
+
+        words = self.TOKEN_PATTERN.findall(query)
+        if not words:
+            result = self.everything
+        else:
+            matches = None
+            for word in words:
+                found = self._lookup(word)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    break
+            result = sorted(matches)
+
+        self._results[query] = result
+        if len(self._results) > 256:
+            self._results.popitem(last=False)
+        return result
+
+
+# ============================================
+# Gardiner sign catalog
+# ============================================
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+GARDINER_SHEET = os.path.join(APP_DIR, "Alan Gardiners List of Hieroglyphic Signs.xlsx")
+GARDINER_OVERRIDES = os.path.join(APP_DIR, "gardiner_overrides.json")  # Curated fixes and extra codes
+GARDINER_CACHE = os.path.join(APP_DIR, "gardiner_catalog.json")  # Compiled catalog, rebuilt when the sources change
+
+GARDINER_CODE = re.compile(r"^(Aa|[A-Z])\d+[A-Za-z]?$")
+GARDINER_SECTION = re.compile(r"^(Aa|[A-Z])\. ")
+
+
+def parse_gardiner_sheet(path):
+    """Read (code, glyph, description, details, section) rows from the Gardiner spreadsheet"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("openpyxl is required to read the Gardiner spreadsheet (pip install openpyxl)")
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    rows = []
+    section = None
+    for row in workbook.worksheets[0].iter_rows(max_col=4, values_only=True):
+        code, glyph, description, details = (str(v).strip() if v is not None else None for v in row)
+        if code is None:
+            continue
+        if GARDINER_SECTION.match(code):
+            section = code
+        elif section is not None and not GARDINER_SECTION.match(code) and GARDINER_CODE.match(code) \
+                and not (glyph and GARDINER_CODE.match(glyph)):
+            # Sign rows only; the trailing glyph grid repeats codes in every column
+            rows.append((code, glyph, description, details, section))
+        elif code[0].isalpha() and code[0].isascii() and not code.startswith("Gardiner"):
+            section = None  # Leaving the numbered sections
+    workbook.close()
+    return rows
+
+
+def compile_gardiner_catalog(sheet_path, overrides_path):
+    """Merge the spreadsheet with the curated overrides into catalog columns"""
+    with open(overrides_path, encoding="utf-8") as f:
+        overrides = json.load(f)
+
+    entries = []
+    seen = set()
+    for code, glyph, description, details, section in parse_gardiner_sheet(sheet_path):
+        if code in seen:
+            continue
+        seen.add(code)
+        if description:
+            description = description.replace("\u2019", "'").rstrip(".")
+        description = overrides["descriptions"].get(code, description) or "Unknown"
+        entries.append([code, description, glyph or "", details or "", section or ""])
+
+    for extra in overrides["extra"]:
+        entry = [extra["code"], extra["description"], extra.get("glyph", ""), "", ""]
+        codes = [e[0] for e in entries]
+        if extra.get("after") in codes:
+            entries.insert(codes.index(extra["after"]) + 1, entry)
+        else:
+            entries.append(entry)
+
+    codes, descriptions, glyphs, details, sections = (list(column) for column in zip(*entries))
+    return {"codes": codes, "descriptions": descriptions, "glyphs": glyphs,
+            "details": details, "sections": sections}
+
+
+def _source_hashes(paths):
+    """SHA-256 of each catalog source file"""
+    hashes = []
+    for path in paths:
+        with open(path, "rb") as f:
+            hashes.append({"name": os.path.basename(path), "sha256": hashlib.sha256(f.read()).hexdigest()})
+    return hashes
+
+
+def load_gardiner_catalog(sheet_path=GARDINER_SHEET, overrides_path=GARDINER_OVERRIDES, cache_path=GARDINER_CACHE):
+    """Load the compiled catalog, recompiling it when the spreadsheet or overrides change
+
+    The cache records the content hashes of its sources, so it stays valid
+    across checkouts (which reset mtimes) and is shipped with the repo;
+    openpyxl is only needed after editing the spreadsheet or overrides.
+    """
+    sources = _source_hashes([sheet_path, overrides_path])
+    cached = None
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("sources") == sources:
+            return cached
+
+    try:
+        catalog = compile_gardiner_catalog(sheet_path, overrides_path)
+    except RuntimeError as e:
+        if cached is None:
+            raise
+        print(f"Using stale Gardiner catalog: {e}")
+        return cached
+
+    catalog["sources"] = sources
+    try:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"))
+    except OSError as e:
+        print(f"Could not write Gardiner catalog cache: {e}")
+    return catalog
+
+
+class GardinerCatalog:
+    """Gardiner sign list, loaded from the compiled cache on first use"""
+
+    def __init__(self, **paths):
+        self._paths = paths
+        self._data = None
+        self._descriptions = None
+
+    def _load(self):
+        if self._data is None:
+            self._data = load_gardiner_catalog(**self._paths)
+        return self._data
+
+    @property
+    def codes(self):
+        return self._load()["codes"]
+
+    @property
+    def descriptions(self):
+        """Code -> description, in catalog order"""
+        if self._descriptions is None:
+            data = self._load()
+            self._descriptions = dict(zip(data["codes"], data["descriptions"]))
+        return self._descriptions
+
+
+GARDINER_CATALOG = GardinerCatalog()
+
 
 class HieroglyphAnnotatorGUI:
-    def __init__(self, root):
+    # Shortcuts that are also text: ignored while typing in the search box
+    TYPING_KEYS = set('aAuli123456789') | {'Delete'}
+    
+    def __init__(self, root, memory_budget_mb=0, trace_path=None):
+        self.startup = StartupTimer()
+        self.startup.mark("modules imported")
+        threading.Thread(target=warm_imports, name="warm-imports", daemon=True).start()
+        
         self.root = root
         self.root.title("🏺 Hieroglyph Manual Annotator")
         self.root.geometry("1400x900")
@@ -26,269 +2855,43 @@ class HieroglyphAnnotatorGUI:
         self.INPUT_DIR = "Temple_Images"  # Updated to match your folder
         self.OUTPUT_DIR = "dataset_labeled"
         self.SAVE_SIZE = (224, 224)
+        self.OUTPUT_FORMAT = "png"  # "png" (per-class folders), "packed" (memory-mappable shards) or "both"
+        self.TILE_CACHE_MB = 256  # Memory budget for pyramid tiles
+        self.IMAGE_CACHE_MB = 1024  # Memory budget for decoded (and prefetched) images
+        self.PREFETCH_AHEAD = 2  # Images decoded ahead of the current one
+        self.PREFETCH_BEHIND = 1  # Images kept decoded behind the current one
+        self.PREVIEW_MIN_SIDE = 1024  # Large JPEGs first show a reduced decode at least this big
+        self.PREVIEW_CACHE_MB = 256  # Disk space for stored previews of large images (0 means no cap)
+        self.PREVIEW_CACHE_DIR = os.path.join(user_cache_dir(), "previews")  # Kept out of the dataset
+        self.RAW_CACHE_MB = 0  # Disk space for decoded images reused across visits (0 disables)
+        self.RAW_CACHE_DIR = os.path.join(user_cache_dir(), "raw")  # Kept out of the dataset
+        self.MEMORY_BUDGET_MB = memory_budget_mb  # Target peak RSS; 0 disables memory budget mode
+        self.SUGGESTIONS = 5  # Likely codes offered for each new box (keys 1-5); 0 disables
+        if self.MEMORY_BUDGET_MB:
+            self.apply_memory_budget()
         
-        # Complete Gardiner symbol descriptions
-        self.SYMBOL_DESCRIPTIONS = {
-            # A. Man and his occupations
-            "A1": "Seated man", "A2": "Man with hand to mouth", "A3": "Man sitting on heel", "A4": "Man with arms raised", 
-            "A5": "Man hiding", "A5a": "Man hiding (variant)", "A6": "Man purifying", "A6a": "Man purifying (variant)", 
-            "A6b": "Man purifying (variant)", "A7": "Fatigued man", "A8": "Man performing hnw", "A9": "Man with basket on head", 
-            "A10": "Man holding an oar", "A11": "Man with scepter and crook", "A12": "Man with bow and quiver", 
-            "A13": "Man with arms bound", "A14": "Man with bleeding head", "A14a": "Man with axe to head", 
-            "A15": "Man falling", "A16": "Man bowing", "A17": "Child with hand to mouth", "A17a": "Child sitting", 
-            "A18": "Child wearing red crown", "A19": "Aged man bending with stick", "A20": "Man leaning on forked stick", 
-            "A21": "Man with stick", "A22": "Statue of man with stick and scepter", "A23": "King with stick and mace", 
-            "A24": "Man striking with stick in both hands", "A25": "Man striking with stick in one hand", 
-            "A26": "Man beckoning", "A27": "Man running", "A28": "Man with arms raised", "A29": "Man upside down", 
-            "A30": "Man with arms outstretched", "A31": "Man with arms turned behind him", "A32": "Man dancing", 
-            "A33": "Man with stick and bundle", "A34": "Man pounding in a mortar", "A35": "Man building a wall", 
-            "A36": "Man straining into a vessel", "A37": "Commoner form A36", "A38": "Man holding two animal emblems", 
-            "A39": "Man holding two giraffes", "A40": "Seated god", "A40a": "Seated god (variant)", "A41": "Seated king", 
-            "A42": "Seated king holding flail", "A42a": "Seated king holding flail (variant)", "A43": "King wearing white crown of Upper Egypt", 
-            "A43a": "King wearing white crown (variant)", "A44": "King holding flail and wearing white crown", 
-            "A45": "King wearing red crown of Lower Egypt", "A45a": "King wearing red crown (variant)", 
-            "A46": "King holding flail and wearing red crown", "A47": "Seated shepherd", "A48": "Man holding knife", 
-            "A49": "Foreigner with stick", "A50": "Noble seated on chair", "A51": "Noble seated on chair with flagellum", 
-            "A52": "Kneeling noble with flail", "A53": "Upright mummy", "A54": "Recumbent mummy", "A55": "Mummy on bed", 
-            "A59": "Man threatening stick with one hand",
-            
-            # Aa. Unclassified signs  
-            "Aa1": "Placenta?", "Aa2": "Pustule or gland?", "Aa3": "Aa2 with substance issuing", "Aa4": "Pot", 
-            "Aa5": "Part of ship?", "Aa6": "Unknown", "Aa7": "Unknown", "Aa8": "Irrigation canal?", 
-            "Aa9": "Unknown", "Aa10": "Unknown", "Aa11": "Unknown", "Aa12": "Unknown", "Aa13": "Unknown", 
-            "Aa14": "Unknown", "Aa15": "Var. Aa13", "Aa16": "Short form Aa13", "Aa17": "Back of something?", 
-            "Aa18": "Var. of Aa17", "Aa19": "Unknown", "Aa20": "Unknown", "Aa21": "Unknown", "Aa22": "Combination of Aa21 + D36", 
-            "Aa23": "Warp between stakes?", "Aa24": "Var. Aa23", "Aa25": "Unknown", "Aa26": "Unknown", 
-            "Aa27": "Unknown", "Aa28": "Builder's tool?", "Aa29": "Var. of Aa28", "Aa30": "Frieze element?", "Aa31": "Var. of Aa30",
-            
-            # B. Woman and her occupations
-            "B1": "Seated Woman", "B2": "Pregnant woman", "B3": "Woman giving birth", "B4": "Var. B3", 
-            "B5": "Woman nursing child", "B6": "Woman and seated child", "B7": "Seated queen holding flower",
-            
-            # C. Anthropomorphic deities
-            "C1": "God with sun-disk and uraeus", "C2": "God with falcon head and sun-disk holding ʿnḫ", 
-            "C3": "God with ibis head", "C4": "God with ram head", "C5": "God with ram head holding ʿnḫ", 
-            "C6": "God with jackal head", "C7": "God with Seth head", "C8": "Min", "C9": "Goddess with horned sun-disk", 
-            "C10": "God with feather", "C10a": "Goddess with feather holding ʿnḫ", "C11": "ḥḥ-figure", "C12": "Amun", 
-            "C17": "Montu", "C18": "Tatjenen", "C19": "Ptah", "C20": "Variant C19",
-            
-            # D. Parts of the human body
-            "D1": "Head", "D2": "Face", "D3": "Hair", "D4": "Eye", "D5": "Eye with paint", "D6": "Eye with paint", 
-            "D7": "Eye with paint", "D8": "Eye enclosed", "D9": "Eye weeping", "D10": "Eye with falcon's head marking", 
-            "D11": "White part of w3ḏt eye", "D12": "Eye pupil", "D13": "Eyebrow", "D14": "White part of w3ḏt eye", 
-            "D15": "Part of w3ḏt eye markings", "D16": "Part of w3ḏt eye markings", "D17": "Markings of w3ḏt eye", 
-            "D18": "Ear", "D19": "Eye, nose, and cheek", "D20": "Var. D19", "D21": "Mouth", "D22": "Mouth with two lines", 
-            "D23": "Mouth with three lines", "D24": "Upper lip with teeth", "D25": "Lips with teeth", "D26": "Lips spewing water", 
-            "D27": "Breast", "D27a": "Var. of D27", "D28": "Two arms", "D29": "Var. of D28", "D30": "Two arms with tail", 
-            "D31": "Combination of signs D32 and U36", "D32": "Two arms embracing", "D33": "Arms holding oar", 
-            "D34": "Arms with shield and axe", "D34a": "Arms with shield and mace", "D35": "Negative arms", "D36": "Arm", 
-            "D37": "Arm holding sign X8", "D38": "Arm holding bread", "D39": "Arm holding W24", "D40": "Arm holding stick", 
-            "D41": "Arm with downward facing palm", "D42": "Arm with downward facing palm", "D43": "Arm with flail", 
-            "D44": "Arm with scepter", "D45": "Arm with brush", "D46": "Hand", "D46a": "Hand with water", "D47": "Hand", 
-            "D48": "Palm without thumb", "D49": "Fist", "D50": "Vertical finger", "D51": "Horizontal finger", 
-            "D52": "Penis", "D53": "Penis with liquid", "D54": "Legs walking", "D55": "Legs walking (reverse of D54)", 
-            "D56": "Leg", "D57": "Leg with T30", "D58": "Foot", "D59": "Foot with D36", "D60": "Foot with water streaming", 
-            "D61": "Toes", "D62": "Var. D61", "D63": "Var. D61",
-            
-            # E. Mammals
-            "E1": "Bull", "E2": "Bull preparing to charge", "E3": "Calf", "E4": "Sacred cow", "E5": "Cow with calf", 
-            "E6": "Horse", "E7": "Donkey", "E8": "Kid", "E9": "Newborn bubalis", "E10": "Ram", "E11": "Ram", 
-            "E12": "Pig", "E13": "Cat", "E14": "Dog", "E15": "Recumbent Jackal", "E16": "Recumbent Jackal on shrine", 
-            "E17": "Jackal", "E18": "Jackal on standard R12", "E19": "O.K. form of last", "E20": "Seth animal", 
-            "E21": "Recumbent Seth animal", "E22": "Lion", "E23": "Recumbent Lion", "E24": "Panther", 
-            "E25": "Hippopotamus", "E26": "Elephant", "E27": "Giraffe", "E28": "Oryx", "E29": "Gazelle", 
-            "E30": "Ibex", "E31": "Goat with collar", "E32": "Baboon", "E33": "Monkey", "E34": "Hare",
-            
-            # F. Parts of mammals
-            "F1": "Head of ox", "F2": "Head of charging ox", "F3": "Head of hippopotamus", "F4": "Forepart of lion", 
-            "F5": "Head of bubalis", "F6": "Forepart of bubalis", "F7": "Head of ram", "F8": "Forepart of ram", 
-            "F9": "Head of leopard", "F10": "Head and neck of animal", "F11": "O.K. form of F10", "F12": "Head and neck of jackal", 
-            "F13": "Horns of ox", "F14": "Combination of F13 and M4", "F15": "Combination of F14 and N5", "F16": "Horn", 
-            "F17": "Combination of F16 and D60 water vessel", "F18": "Tusk of elephant", "F19": "Jawbone of ox", 
-            "F20": "Tongue", "F21": "Ear of ox", "F22": "Hindquarters of leopard or lion", "F23": "Foreleg of ox", 
-            "F24": "Reverse of F23", "F25": "Leg and hoof of ox", "F26": "Goatskin", "F27": "Cowskin", "F28": "Var. of F27", 
-            "F29": "Combination of F28 + arrow", "F30": "Water skin", "F31": "Three fox skins", "F32": "Animal belly and tail", 
-            "F33": "Tail", "F34": "Heart", "F35": "Heart and windpipe", "F36": "Lung and windpipe", "F37": "Backbone and ribs", 
-            "F38": "Var. of F37", "F39": "Backbone and spinal cord", "F40": "Backbone and spinal cord at each end", 
-            "F41": "Vertebrae", "F42": "Rib", "F43": "Ribs", "F44": "Leg bone with meat", "F45": "Heifer uterus", 
-            "F46": "Intestine", "F47": "Var. of F46", "F48": "Var. of F46", "F49": "Var. of F46", "F50": "Combination of F46 and S29", 
-            "F51": "Piece of flesh", "F52": "Excrement",
-            
-            # G. Birds
-            "G1": "Vulture", "G2": "Two Vultures", "G3": "Combination of G1 + U1", "G4": "Buzzard", "G5": "Falcon", 
-            "G6": "Falcon with flail", "G7": "Falcon on standard", "G7a": "Var of G7, Falcon in boat", 
-            "G7b": "Var of G7, G7a", "G8": "Combination of G5 + S12", "G9": "Falcon with sun disk", "G10": "Falcon in sacred bark", 
-            "G11": "Falcon image", "G12": "Falcon image with flail", "G13": "Falcon image with S9", "G14": "Vulture", 
-            "G15": "Vulture with flail", "G16": "Nehkbet and Edjo", "G17": "Owl", "G18": "Two Owls", "G19": "Combination of G17 + D37", 
-            "G20": "Combination of G17 + D36", "G21": "Guinea fowl", "G22": "Hoopoe", "G23": "Lapwing", "G24": "Var. of G23", 
-            "G25": "Crested Ibis", "G26": "Sacred ibis on standard", "G26a": "Sacred ibis", "G27": "Flamingo", 
-            "G28": "Black ibis", "G29": "Jabiru", "G30": "Three jabirus", "G31": "Heron", "G32": "Heron on perch", 
-            "G33": "Egret", "G34": "Ostrich", "G35": "Cormorant", "G36": "Swallow", "G37": "Sparrow", "G38": "Goose", 
-            "G39": "Duck", "G40": "Duck flying", "G41": "Duck landing", "G42": "Fattened bird", "G43": "Quail chick, var. Z7", 
-            "G44": "Two quail chicks", "G45": "Combination of G43 + D36", "G46": "Combination of G43 + U1", "G47": "Duckling", 
-            "G48": "Three ducklings in nest", "G49": "Ducks' heads protruding from pool", "G50": "Two plovers", 
-            "G51": "Bird pecking fish", "G52": "Goose feeding", "G53": "Human headed bird", "G54": "Plucked bird",
-            
-            # H. Parts of birds
-            "H1": "Head of duck", "H2": "Head of crested bird", "H3": "Head of spoonbill", "H4": "Head of vulture", 
-            "H5": "Wing", "H6": "Feather", "H7": "Claw", "H8": "Egg",
-            
-            # I. Amphibious animals, reptiles, etc.
-            "I1": "Lizard", "I2": "Turtle", "I3": "Crocodile", "I4": "Crocodile on shrine", "I5": "Crocodile with curved tail", 
-            "I6": "Crocodile scales", "I7": "Frog", "I8": "Tadpole", "I9": "Horned viper", "I10": "Cobra", 
-            "I11": "Two cobras", "I12": "Erect cobra", "I13": "Combination of I12 + V30", "I14": "Snake", "I15": "Var. of I15",
-            
-            # K. Fish and parts of fish
-            "K1": "Bulti fish", "K2": "Barbel fish", "K3": "Mullet fish", "K4": "Oxyrhynchus fish", "K5": "Pike fish", 
-            "K6": "Fish scale", "K7": "Blowfish",
-            
-            # L. Invertebrates and lesser animals
-            "L1": "Scarab beetle", "L2": "Bee", "L3": "Fly", "L4": "Locust", "L5": "Centipede", "L6": "Shell", "L7": "Scorpion",
-            
-            # M. Trees and plants
-            "M1": "Tree", "M2": "Plant", "M3": "Branch", "M4": "Stripped palm branch", "M5": "Combination of M4 + X1", 
-            "M6": "Combination of M4 + D21", "M7": "Combination of M4 + Q3", "M8": "Pool with lilies", "M9": "Lily", 
-            "M10": "Lily bud", "M11": "Flower and stem", "M12": "Lily plant", "M13": "Papyrus stem", "M14": "Combination of M13 and I10", 
-            "M15": "Papyrus clump with downward facing buds", "M16": "Papyrus clump", "M17": "Reed leaf", 
-            "M18": "Combination of M17 + D54", "M19": "Conical cakes between signs M17 and U36", "M20": "Reed field", 
-            "M21": "Reed field with root", "M22": "Rush with shoots", "M23": "Sedge", "M24": "Combination of M23 + D21", 
-            "M25": "Combination of M26 + M24", "M26": "Sedge", "M27": "Combination of M26 + D36", "M28": "Combination of M26 + V20", 
-            "M29": "Pod", "M30": "Root", "M31": "Rhizome", "M32": "Var of M31", "M33": "Grain", "M34": "Emmer sheaf", 
-            "M35": "Grain heap", "M36": "Flax bundle", "M37": "Flax bundle with stems", "M38": "Flax bundle", 
-            "M39": "Basket of fruit or grain", "M40": "Reed bundle", "M41": "Wood log", "M42": "Flower", 
-            "M43": "Grape vines on props", "M44": "Thorn",
-            
-            # N. Sky, earth, water
-            "N1": "Sky", "N2": "Sky with broken S40", "N3": "Var. of N2", "N4": "Sky with rain", "N5": "Sun", 
-            "N6": "Sun with uraeus", "N7": "Combination of N5 + T28", "N8": "Sun with rays", "N9": "Moon", "N10": "Var of N9", 
-            "N11": "Crescent moon", "N12": "Var. of N11", "N13": "Combination of half of N11 and N14", "N14": "Star", 
-            "N15": "Star encircled", "N16": "Flat land with grain", "N17": "Var. of N16", "N18": "Strip of sand", 
-            "N19": "Two strips of sand", "N20": "Tongue of land", "N21": "Tongue of land", "N22": "Tongue of land", 
-            "N23": "Canal", "N24": "Irrigation canal system", "N25": "Mountain range", "N26": "Mountain", 
-            "N27": "Sunrise over mountain", "N28": "Hill with sun rays", "N29": "Sandy slope", "N30": "Hill with shrubs", 
-            "N31": "Road bordered by shrubs", "N32": "Lump of clay, Var. Aa2 and F52", "N33": "Grain of sand", 
-            "N33b": "Grain of sand (variant)", "N34": "Metal Ingot", "N35": "Water ripple", "N35a": "Three ripples", 
-            "N36": "Canal", "N37": "Pool", "N38": "Var. of N37", "N39": "Var. of N37", "N40": "Combination of N37 and D54", 
-            "N41": "Well with water", "N42": "Var. of N41", "N58": "Well with water",
-            
-            # O. Buildings, parts of buildings, etc.
-            "O1": "House plan", "O2": "Combination of O1 + T3", "O3": "Combination of O1 + P8 + X3 + W22", "O4": "Reed shelter", 
-            "O5": "Winding wall", "O6": "Plan of rectangular enclosure", "O7": "Var of O6", "O8": "Combination of O7 + O29", 
-            "O9": "Combination of O7 + O30", "O10": "Combination of O6 + G5", "O12": "Palace with battlements", 
-            "O13": "Enclosure with battlements", "O14": "Var. of O13", "O15": "Walled enclosure with buttresses + W10 + X1", 
-            "O16": "Gateway with serpents", "O17": "Var. of O16", "O18": "Shrine in profile", "O19": "Shrine in profile with poles", 
-            "O20": "Shrine", "O21": "Shrine Facade", "O22": "Booth supported by pole", "O23": "Double platform", 
-            "O24": "Pyramid surrounded by wall", "O25": "Obelisk", "O26": "Stela", "O27": "Hall with columns", 
-            "O28": "Column with tenon", "O29": "Wood column", "O29V": "Vertical wood column", "O30": "Supporting pole", 
-            "O31": "Door", "O32": "Gateway", "O33": "Palace or tomb facade", "O34": "Door bolt", "O35": "Combination of O34 + D54", 
-            "O36": "Wall", "O37": "Falling wall", "O38": "Corner of wall", "O39": "Stone slab", "O40": "Stairway", 
-            "O41": "Double stairway", "O42": "Fence", "O43": "Var. of O42", "O44": "Min emblem", "O45": "Domed building", 
-            "O46": "Var. of O45", "O47": "Enclosed mound", "O48": "Var. of O47", "O49": "Area with crossroads", 
-            "O50": "Threshing floor with grain", "O51": "Grain mound on mud floor",
-            
-            # P. Ships and parts of ships
-            "P1": "Boat on water", "P1a": "Boat upside down", "P2": "Ship sailing", "P3": "Sacred bark", "P4": "Boat with net", 
-            "P5": "Sail", "P6": "Mast", "P7": "Combination of P6 +D36", "P8": "Oar", "P9": "Combination of P8 + I9", 
-            "P10": "Steering oar", "P11": "Mooring post",
-            
-            # Q. Domestic and funerary furniture
-            "Q1": "Seat", "Q2": "Portable seat", "Q3": "Stool", "Q4": "Headrest", "Q5": "Chest", "Q6": "Coffin", "Q7": "Brazier with flame",
-            
-            # R. Temple furniture and sacred emblems
-            "R1": "Table with jug and loaves", "R2": "Table with bread slices", "R3": "Low table with Jug and loaves", 
-            "R4": "Bread loaf on mat", "R5": "Censer", "R6": "Var. of R5", "R7": "Incense bowl", "R8": "Flag", 
-            "R9": "Combination of R8 + V33", "R10": "Combination of R8 + T28 + N29", "R11": "Reed column", "R12": "Standard", 
-            "R13": "Combination of G5 + R14", "R14": "Var of R13", "R15": "Spear as standard", "R16": "Scepter with feathers", 
-            "R17": "Feathered wig with pole", "R18": "Var. of R17", "R19": "Combination of S40 + feather", "R20": "Seshat emblem", 
-            "R21": "Var. of R20", "R22": "Min emblem", "R23": "Var. of R22", "R24": "Neith emblem", "R25": "Var. of R24",
-            
-            # S. Crowns, dress, staves, etc.
-            "S1": "White crown of Upper Egypt", "S2": "Combination of S1 + V30", "S3": "Red crown of Lower Egypt", 
-            "S4": "Combination of S3 + V30", "S5": "Combination of red and white crown", "S6": "Combination of S5 + V30", 
-            "S7": "Blue Crown", "S8": "Atef crown", "S9": "Double plumes", "S10": "Headband", "S11": "Collar", 
-            "S12": "Collar of beads", "S13": "Combination of S12 + D58", "S14": "Combination of S12 + T3", 
-            "S14a": "Combination of S12 + S40", "S15": "Faience pectoral", "S16": "Var. of S15", "S17": "Var of S15", 
-            "S18": "Bead necklace", "S19": "Necklace and cylinder seal", "S20": "Necklace and cylinder seal", "S21": "Ring", 
-            "S22": "Shoulder knot", "S23": "Knotted cloth", "S24": "Knotted belt", "S25": "Garment with ties", "S26": "Apron", 
-            "S27": "Horizontal strips of cloth", "S28": "Cloth with fringe + S29", "S29": "Folded cloth", 
-            "S30": "Combination of S29 + I9", "S31": "Combination of S29 + U1", "S32": "Cloth with fringe", "S33": "Sandal", 
-            "S34": "Sandal strap", "S35": "Sunshade", "S36": "Var. of S35", "S37": "Fan", "S38": "Crook", "S39": "Crook", 
-            "S40": "Scepter with Seth animal", "S41": "Scepter with spiral shaft and Seth animal", "S42": "Scepter", 
-            "S43": "Staff", "S44": "Staff with flail", "S45": "Flail",
-            
-            # T. Warfare, hunting, butchery
-            "T1": "Angular headed mace", "T2": "T3 tilted", "T3": "Pear shaped mace", "T4": "Var of T3", 
-            "T5": "Combination of T3 + I10", "T6": "Combination of T5 + extra I10", "T7": "Axe", "T7a": "Axe", 
-            "T8": "Dagger", "T8a": "Dagger", "T9": "Bow", "T9a": "Var of T9", "T10": "Composite bow", "T11": "Arrow", 
-            "T12": "Bowstring", "T13": "Wood tied together", "T14": "Throw stick", "T15": "Var. of T14", "T16": "Scimitar", 
-            "T17": "Chariot", "T18": "Crook with package", "T19": "Bone harpoon head", "T20": "Var. of T19", "T21": "Harpoon", 
-            "T22": "Arrowhead", "T23": "Var. of T22", "T24": "Fishing net", "T25": "Reed Float", "T26": "Bird Trap", 
-            "T27": "Var. of T26", "T28": "Butcher's block", "T29": "Combination of T28 + T30", "T30": "Knife", 
-            "T31": "Knife sharpener", "T32": "Combination of T31 + D54", "T33": "Butcher's knife sharpener", 
-            "T34": "Butcher's knife", "T35": "Var. of T34",
-            
-            # U. Agriculture, crafts, and professions
-            "U1": "Sickle", "U2": "Var. of U1", "U3": "Combination of U1 + D4", "U4": "Combination of U1 + Aa11", 
-            "U5": "Var. of U4", "U6": "Hoe", "U7": "Var. of U6", "U8": "Hoe", "U9": "Grain measure with grain streaming outwards", 
-            "U10": "Combination of U9 + M33", "U11": "Combination of S38 + U9", "U12": "Combination of D50 + U9", 
-            "U13": "Plow", "U14": "Two branches joined", "U15": "Sled", "U16": "Sled with jackal head bearing a load", 
-            "U17": "Pick with pool", "U18": "Var. U17", "U19": "Adze", "U20": "Var. of U19", "U21": "Adze with wood block", 
-            "U22": "Chisel", "U23": "Chisel", "U24": "Drill for stone", "U25": "Var. of U24", "U26": "Drill for beads", 
-            "U27": "Var. of U26", "U28": "Fire drill", "U29": "Var. of U28", "U30": "Kiln", "U31": "Baker's rake", 
-            "U32": "Mortar and pestle", "U33": "Pestle", "U34": "Spindle", "U35": "Combination of U34 + I9", 
-            "U36": "Club used in washing", "U37": "Razor", "U38": "Scale", "U39": "Scale post", "U40": "Var. of U39", "U41": "Plumb bob",
-            
-            # V. Rope, fiber, baskets, bags, etc.
-            "V1": "Rope coil", "V2": "Combination of V1 + O34", "V3": "Same as V2, but with two additional coils", 
-            "V4": "Lasso", "V5": "Looped rope", "V6": "Cord with loop facing downwards", "V7": "Cord with loop facing upwards", 
-            "V8": "Var. of V7", "V9": "Round cartouche", "V10": "Oval cartouche", "V11": "End of cartouche", "V12": "String", 
-            "V13": "Tethering rope", "V14": "Var. of V13", "V15": "Combination of V13 and D54", "V16": "Hobble for cattle", 
-            "V17": "Herdsman's shelter", "V18": "Var. of V17", "V19": "Hobble for cattle", "V20": "Hobble for cattle sans crossbar", 
-            "V21": "Combination of V20 + I10", "V22": "Whip", "V23": "Var. of V22", "V24": "Cord on Stick", "V25": "Var. of V24", 
-            "V26": "Spool with thread", "V27": "Var. of V26", "V28": "Wick", "V29": "Swab", "V30": "Basket", "V31": "Basket with handle", 
-            "V31a": "V31 reversed", "V32": "Wicker satchel", "V33": "Linen bag", "V34": "Var. of V33", "V35": "Var. of V33", 
-            "V36": "Receptacle", "V37": "Bandage", "V38": "Bandage", "V39": "Tie",
-            
-            # W. Vessels of stone and earthenware
-            "W1": "Oil jar", "W2": "Oil jar without ties", "W3": "Alabaster basin", "W4": "Combination of W3 + O22", 
-            "W5": "Combination of W3 + T28", "W6": "Vessel", "W7": "Granite bowl", "W8": "Var. of W7", "W9": "Stone jug", 
-            "W10": "Cup", "W10a": "Pot", "W11": "Ring stand", "W12": "Ring stand", "W13": "Pot", "W14": "Tall jar", 
-            "W15": "Tall jar with water", "W16": "Combination of W15 + W12", "W17": "Tall jars in rack", "W18": "Var. W17", 
-            "W19": "Milk jug", "W20": "Milk jug with leaf", "W21": "Wine jars", "W22": "Beer jugs", "W23": "Jug with handles", 
-            "W24": "Bowl", "W25": "Combination of W24 + legs",
-            
-            # X. Vessels of glass and similar materials
-            "X1": "Small bread loaf", "X2": "Tall bread loaf", "X3": "Var. of X2", "X4": "Bread roll", "X5": "Var. of X4", 
-            "X6": "Round loaf with baker's mark", "X7": "Half loaf of bread", "X8": "Conical Loaf",
-            
-            # Y. Writing, games, music
-            "Y1": "Papyrus scroll", "Y1v": "Papyrus scroll (vertical)", "Y2": "Var. of Y1", "Y3": "Scribal kit", 
-            "Y4": "Y4 reversed", "Y5": "Game board", "Y6": "Game piece", "Y7": "Harp", "Y8": "Sistrum",
-            
-            # Z. Strokes, geometrical figures, etc.
-            "Z1": "Stroke", "Z2": "Triple stroke", "Z3": "Three Z1 vertical strokes", "Z3a": "Z2 vertical", 
-            "Z4": "Two diagonal strokes", "Z4a": "Two vertical strokes", "Z5": "Diagonal stroke in hieratic", 
-            "Z6": "Hieratic var. of A13 and A14", "Z7": "From hieratic var. of G43", "Z8": "Oval", "Z9": "Crossed sticks", 
-            "Z10": "Var. of Z9", "Z11": "Crossed planks", "Z1b": "Stroke variant",
-            
-            # Not Listed
-            "Not Listed": "Symbol not in standard Gardiner classification"
-        }
-        
-        # Create the list of symbols from the descriptions dictionary
-        self.GARDINER_CATEGORIES = list(self.SYMBOL_DESCRIPTIONS.keys())
+        # Gardiner symbols and descriptions, compiled from the bundled spreadsheet
+        self.SYMBOL_DESCRIPTIONS = GARDINER_CATALOG.descriptions
+        self.GARDINER_CATEGORIES = list(GARDINER_CATALOG.codes)
         self.CATEGORY_CODES = self.GARDINER_CATEGORIES.copy()
         
-        # Create output directories
-        for code in self.CATEGORY_CODES:
-            os.makedirs(os.path.join(self.OUTPUT_DIR, code), exist_ok=True)
+        # Search index and the symbols currently shown in the listbox
+        self.symbol_index = SymbolSearchIndex(self.GARDINER_CATEGORIES, self.SYMBOL_DESCRIPTIONS)
+        self.filtered_symbols = list(self.GARDINER_CATEGORIES)
+        self.search_after_id = None
+        
+        # Category output directories are created on first save (see CropSaveWorker)
+        self.populate_after_id = None
         
         # State variables
-        self.current_image = None
+        self.current_image = None  # Full-resolution pixels (None while they are still decoding)
+        self.image_shape = None  # Full-resolution (h, w); all geometry uses these coordinates
         self.current_image_path = None
-        self.image_files = []
+        self.image_files = []  # Paths relative to INPUT_DIR, in natural order
+        self.image_keys = []  # natural_key of each entry of image_files
+        self.scanner = None
+        self.scanning = False
         self.current_image_index = 0
-        self.boxes = []
         self.zoom = 1.0
         self.offset_x = 0
         self.offset_y = 0
@@ -299,8 +2902,20 @@ class HieroglyphAnnotatorGUI:
         
         # Free shape variables
         self.free_shape_mode = False
-        self.polygon_points = []
-        self.polygons = []  # Store completed polygons
+        self.polygon_points = []  # Points of the polygon being drawn, in image coordinates
+        
+        # Boxes and polygons of the current image (image coordinates, with database ids)
+        self.annotations = AnnotationStore()
+        
+        # Glyph boxes proposed in the background, shown as ghosts until accepted
+        self.SHOW_PROPOSALS = True
+        self.FIND_THRESHOLD = 0.7  # Minimum correlation of a "find similar" match
+        self.FIND_ANGLES = (0,)  # Template rotations (degrees) tried by "find similar", e.g. (-10, 0, 10)
+        self.proposals = AnnotationStore()
+        self.proposer = RegionProposer()
+        self.proposal_future = None
+        self.find_future = None  # Running find-similar search (shares the proposer's thread)
+        self.find_code = None  # Code of the saved box a find-similar search started from
         
         # Display transformation tracking
         self.display_scale_x = 1.0
@@ -308,8 +2923,139 @@ class HieroglyphAnnotatorGUI:
         self.display_x1 = 0
         self.display_y1 = 0
         
+        # Last rendered viewport (key identifies image, zoom and visible region)
+        self.view_cache_key = None
+        self.view_array = None  # Pixels of the last render, reused when panning
+        self.view_draft = False  # Last render used the fast nearest-neighbour pass
+        self.photo = None
+        self.image_item = None  # Canvas item showing the rendered viewport
+        
+        # Pan and zoom events are coalesced into one draft render per frame,
+        # followed by a full-quality render once input stops
+        self.FRAME_MS = 16
+        self.REFINE_DELAY_MS = 150
+        self.frame_after_id = None
+        self.refine_after_id = None
+        
+        # Instrumentation: spans go to TRACER, the watchdog samples the stack when the loop stalls
+        self.TRACE_PATH = trace_path  # Chrome trace JSON written on exit (None: only on F3)
+        self.STALL_MS = 250  # Main loop pauses longer than this are sampled
+        self.HEARTBEAT_MS = 50
+        self.watchdog = StallWatchdog(TRACER, self.STALL_MS / 1000)
+        if self.TRACE_PATH:
+            TRACER.keep_events(Tracer.FULL_EVENTS)
+        self.show_hud = False
+        self.hud_item = None
+        self.render_requests = 0  # Input events coalesced into the next frame
+        self.loop_lag = 0.0  # How late the last heartbeat ran, in seconds
+        
+        # Pyramid of the current image, tiles shared across images in one LRU cache
+        self.tile_cache = ByteLRUCache(self.TILE_CACHE_MB * 1024 * 1024)
+        self.pyramid = None
+        self.pyramid_scale = 1.0  # Full-resolution pixels per pyramid base pixel (>1 for a preview)
+        
+        # Background decode of the full-resolution image while a preview is shown
+        self.full_image_future = None
+        self.unhashed = []  # (annotation id, kind, geometry) drawn on the preview, hashed once pixels arrive
+        
+        # Decoded images, filled ahead of navigation by background workers
+        self.image_cache = ByteLRUCache(self.IMAGE_CACHE_MB * 1024 * 1024)
+        self.previews = PreviewCache(self.PREVIEW_CACHE_DIR, self.PREVIEW_CACHE_MB * 1024 * 1024)
+        self.raw_cache = RawImageCache(self.RAW_CACHE_DIR, self.RAW_CACHE_MB * 1024 * 1024)
+        if self.MEMORY_BUDGET_MB:
+            # Workers return downsampled working copies; full-resolution pixels stay in memory maps
+            self.prefetcher = ImagePrefetcher(
+                self.image_cache, workers=1,
+                decoder=lambda path: self.raw_cache.load_working_copy(path, self.WORKING_IMAGE_MB * 1024 * 1024))
+        else:
+            # Revisited images are memory-mapped from the disk cache instead of decoded again
+            decoder = self.raw_cache.load if self.RAW_CACHE_MB else decode_image
+            self.prefetcher = ImagePrefetcher(self.image_cache, previews=self.previews, decoder=decoder)
+        
+        # Every annotation is persisted as it is drawn; crops are written in the background
+        self.annotation_db = AnnotationDatabase(os.path.join(self.OUTPUT_DIR, ANNOTATION_DB))
+        
+        # Which images already have saved annotations (paths relative to INPUT_DIR)
+        self.progress = ImageProgress(os.path.relpath(path, self.INPUT_DIR)
+                                      for path in self.annotation_db.annotated_images())
+        self.resume_image = self.annotation_db.get_session("last_image")
+        
+        # Codes of similar saved crops are suggested for new boxes; saving extends the index
+        self.suggestions = CodeSuggestionIndex(os.path.join(self.OUTPUT_DIR, SUGGEST_DIR))
+        self.suggested_codes = []
+        self.save_worker = CropSaveWorker(self.annotation_db, self.OUTPUT_DIR, self.OUTPUT_FORMAT,
+                                          suggestions=self.suggestions if self.SUGGESTIONS else None)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         self.setup_gui()
-        self.load_images()
+        self.startup.mark("window built")
+        
+        # Fill the symbol list and open the first image once the window has been drawn
+        self.first_paint_done = False
+        self.image_canvas.bind("<Expose>", self.on_first_paint)
+        self.root.after(500, self.on_first_paint)
+        self.poll_save_progress()
+        # The first heartbeat runs from the event loop and arms the watchdog
+        self.root.after(self.HEARTBEAT_MS, self.heartbeat, time.perf_counter())
+    
+    def heartbeat(self, scheduled):
+        """Tell the stall watchdog the main loop is alive and refresh the HUD"""
+        now = time.perf_counter()
+        self.watchdog.beat()
+        self.loop_lag = max(0.0, now - scheduled - self.HEARTBEAT_MS / 1000)
+        if self.show_hud:
+            self.update_hud()
+        self.root.after(self.HEARTBEAT_MS, self.heartbeat, now)
+    
+    def update_hud(self):
+        """Draw frame time, loop lag and event backlog in the canvas corner"""
+        text = (f"frame {TRACER.last('display_image') * 1000:5.1f} ms   lag {self.loop_lag * 1000:4.0f} ms   "
+                f"backlog {self.render_requests}   stalls {self.watchdog.stalls}")
+        if self.hud_item is None:
+            self.hud_item = self.image_canvas.create_text(8, 8, anchor=tk.NW, text=text, fill='#00FFFF',
+                                                          font=('Courier', 10, 'bold'))
+        else:
+            self.image_canvas.itemconfigure(self.hud_item, text=text, state='normal')
+        self.image_canvas.tag_raise(self.hud_item)
+    
+    def toggle_hud(self):
+        """Show or hide the performance HUD"""
+        self.show_hud = not self.show_hud
+        if self.show_hud:
+            TRACER.keep_events(Tracer.FULL_EVENTS)  # Record a full trace from now on
+            self.update_hud()
+        elif self.hud_item is not None:
+            self.image_canvas.itemconfigure(self.hud_item, state='hidden')
+    
+    def export_trace(self):
+        """Save the recorded spans as Chrome trace-event JSON"""
+        path = filedialog.asksaveasfilename(title="Export trace", defaultextension=".json",
+                                            initialfile="annotator_trace.json",
+                                            filetypes=[("Chrome trace", "*.json")])
+        if path:
+            count = TRACER.export(path)
+            self.status_label.config(text=f"Exported {count} trace events to {os.path.basename(path)}")
+    
+    def on_first_paint(self, event=None):
+        """Start the deferred startup work after the window is first shown"""
+        if self.first_paint_done:
+            return
+        self.first_paint_done = True
+        self.image_canvas.unbind("<Expose>")
+        self.startup.mark("first paint")
+        self.populate_categories()
+        self.root.after(1, self.load_images)
+        if self.SUGGESTIONS:
+            threading.Thread(target=self.prepare_suggestions, name="suggest-index", daemon=True).start()
+    
+    def prepare_suggestions(self):
+        """Load the suggestion index, building it from earlier saves if there is none yet"""
+        if self.suggestions.exists():
+            self.suggestions.load()
+            print(f"Suggestion index: {len(self.suggestions)} crop(s)")
+        else:
+            count = self.suggestions.import_saved(self.annotation_db, self.OUTPUT_DIR, self.SAVE_SIZE)
+            print(f"Suggestion index built from {count} saved crop(s)")
         
     def setup_gui(self):
         """Setup the GUI layout"""
@@ -327,6 +3073,9 @@ class HieroglyphAnnotatorGUI:
         
         self.image_canvas = tk.Canvas(canvas_frame, bg='#1e1e1e', highlightthickness=0)
         self.image_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.overlay = AnnotationOverlay(self.image_canvas, self.annotations)
+        self.proposal_overlay = AnnotationOverlay(self.image_canvas, self.proposals,
+                                                  color='#FFD700', dash=(4, 4), labels=False)
         
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.image_canvas.yview)
@@ -373,6 +3122,9 @@ class HieroglyphAnnotatorGUI:
         self.progress_label = ttk.Label(info_frame, text="")
         self.progress_label.pack()
         
+        self.status_label = ttk.Label(info_frame, text="", foreground='#4CAF50')
+        self.status_label.pack()
+        
         # Symbol list
         symbol_frame = ttk.LabelFrame(right_frame, text="🏷️ Hieroglyph Symbols", padding=10)
         symbol_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -383,10 +3135,15 @@ class HieroglyphAnnotatorGUI:
         
         ttk.Label(search_frame, text="🔍 Search:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', self.filter_categories)
+        self.search_var.trace('w', self.schedule_filter)
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
         
+        # Codes suggested for the last drawn box, chosen with the number keys
+        self.suggestion_label = ttk.Label(symbol_frame, text="", foreground='#FF9800',
+                                          font=('Arial', 10, 'bold'), wraplength=370, justify=tk.LEFT)
+        self.suggestion_label.pack(anchor=tk.W, pady=(0, 5))
+        
         # Category listbox with scrollbar
         listbox_frame = ttk.Frame(symbol_frame)
         listbox_frame.pack(fill=tk.BOTH, expand=True)
@@ -398,9 +3155,6 @@ class HieroglyphAnnotatorGUI:
         listbox_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.category_listbox.configure(yscrollcommand=listbox_scrollbar.set)
         
-        # Populate category list
-        self.populate_categories()
-        
         # Selected symbol information
         selected_frame = ttk.LabelFrame(symbol_frame, text="📋 Selected Symbol", padding=10)
         selected_frame.pack(fill=tk.X, pady=(10, 0))
@@ -426,8 +3180,11 @@ class HieroglyphAnnotatorGUI:
         
         ttk.Button(action_frame, text="👁️ Preview Boxes", command=self.preview_boxes).pack(fill=tk.X, pady=(0, 5))
         ttk.Button(action_frame, text="💾 Save Symbol", command=self.save_current_symbol).pack(fill=tk.X, pady=(0, 5))
+        ttk.Button(action_frame, text="🔎 Find Similar", command=self.find_similar).pack(fill=tk.X, pady=(0, 5))
         ttk.Button(action_frame, text="➡️ Next Image", command=self.next_image).pack(fill=tk.X, pady=(0, 5))
         ttk.Button(action_frame, text="⬅️ Previous Image", command=self.previous_image).pack(fill=tk.X, pady=(0, 5))
+        ttk.Button(action_frame, text="⏭️ Next Unannotated", command=self.next_unannotated).pack(fill=tk.X, pady=(0, 5))
+        ttk.Button(action_frame, text="↩️ Resume Last Session", command=self.resume).pack(fill=tk.X, pady=(0, 5))
         ttk.Button(action_frame, text="📁 Open Folder", command=self.open_output_folder).pack(fill=tk.X)
         
         # Keyboard shortcuts help
@@ -436,11 +3193,20 @@ class HieroglyphAnnotatorGUI:
         
         shortcuts_text = """Navigation:
 • N/P: Next/Previous image
+• A / Shift+A: Accept proposed box / all
+• I: Find instances of the box under mouse
+• Esc: Stop searching
+• F2: Performance HUD
+• F3: Export trace
+• U: Next unannotated image
+• L: Resume at last session's image
 • ← → ↑ ↓: Pan image
 • +/-: Zoom in/out
 • R: Reset view
 • C: Clear boxes
+• Delete: Remove annotation under mouse
 • S: Save symbol
+• 1-5: Choose a suggested code
 
 Free Shape Mode:
 • F: Toggle free shape mode
@@ -465,32 +3231,48 @@ Free Shape Mode:
         self.root.bind("<Key>", self.on_key_press)
         self.root.focus_set()
         
-    def populate_categories(self):
-        """Populate the category listbox"""
-        self.category_listbox.delete(0, tk.END)
-        for i, symbol in enumerate(self.GARDINER_CATEGORIES):
-            description = self.SYMBOL_DESCRIPTIONS.get(symbol, "Unknown")
-            self.category_listbox.insert(tk.END, f"{i+1:3d}. {symbol} - {description}")
+    def populate_categories(self, start=0, chunk=200):
+        """Populate the category listbox a chunk at a time so the window stays responsive"""
+        if start == 0:
+            self.category_listbox.delete(0, tk.END)
+            self.filtered_symbols = list(self.GARDINER_CATEGORIES)
+        self.category_listbox.insert(tk.END, *self.symbol_index.labels[start:start + chunk])
+        
+        if start + chunk < len(self.symbol_index.labels):
+            self.populate_after_id = self.root.after(1, self.populate_categories, start + chunk, chunk)
+        else:
+            self.populate_after_id = None
+            self.startup.mark("symbols listed")
     
+    def schedule_filter(self, *args):
+        """Debounce search keystrokes: filter once typing pauses"""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(150, self.filter_categories)
+    
+    @traced()
     def filter_categories(self, *args):
         """Filter categories based on search text"""
-        search_text = self.search_var.get().lower()
+        self.search_after_id = None
+        if self.populate_after_id is not None:
+            # Typing before the initial fill finished replaces it
+            self.root.after_cancel(self.populate_after_id)
+            self.populate_after_id = None
+        matches = self.symbol_index.search(self.search_var.get())
+        
+        # Remember the filtered symbols so selection and saving can reuse them
+        self.filtered_symbols = [self.symbol_index.codes[i] for i in matches]
         self.category_listbox.delete(0, tk.END)
-
-        for i, symbol in enumerate(self.GARDINER_CATEGORIES):
-            description = self.SYMBOL_DESCRIPTIONS.get(symbol, "Unknown")
-            if search_text in symbol.lower() or search_text in description.lower():
-                self.category_listbox.insert(tk.END, f"{i+1:3d}. {symbol} - {description}")
+        if matches:
+            self.category_listbox.insert(tk.END, *[self.symbol_index.labels[i] for i in matches])
     
     def on_category_select(self, event):
         """Handle category selection"""
         selection = self.category_listbox.curselection()
         if selection:
             index = selection[0]
-            # Get the actual symbol index from the filtered list
-            search_text = self.search_var.get().lower()
-            filtered_symbols = [symbol for symbol in self.GARDINER_CATEGORIES 
-                              if search_text in symbol.lower() or search_text in self.SYMBOL_DESCRIPTIONS.get(symbol, "").lower()]
+            # Get the actual symbol from the filtered list
+            filtered_symbols = self.filtered_symbols
             if index < len(filtered_symbols):
                 selected_symbol = filtered_symbols[index]
                 description = self.SYMBOL_DESCRIPTIONS.get(selected_symbol, "Unknown")
@@ -500,55 +3282,264 @@ Free Shape Mode:
                 self.symbol_description_label.config(text=description)
     
     def load_images(self):
-        """Load image files from input directory"""
+        """Start scanning the input directory; the first image opens as soon as it is found"""
         if not os.path.exists(self.INPUT_DIR):
+            self.startup.report()
             messagebox.showerror("Error", f"Input directory '{self.INPUT_DIR}' not found!")
             return
             
-        self.image_files = [f for f in os.listdir(self.INPUT_DIR) 
-                           if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        self.image_files = []
+        self.image_keys = []
+        self.progress.reset(self.image_files)
+        self.current_image_index = 0
+        self.scanner = ImageScanner(self.INPUT_DIR, os.path.join(self.OUTPUT_DIR, IMAGE_MANIFEST))
+        self.scanner.start()
+        self.scanning = True
+        self.poll_scan()
+    
+    def poll_scan(self):
+        """Merge newly scanned images into the natural-order list"""
+        finished = False
+        try:
+            while True:
+                batch = self.scanner.results.get_nowait()
+                if batch is None:
+                    finished = True
+                    break
+                self.progress.add_paths(batch)
+                for rel_path in batch:
+                    key = natural_key(rel_path)
+                    pos = bisect.bisect_right(self.image_keys, key)
+                    self.image_keys.insert(pos, key)
+                    self.image_files.insert(pos, rel_path)
+                    # Keep pointing at the image on screen
+                    if self.current_image_path is not None and pos <= self.current_image_index:
+                        self.current_image_index += 1
+        except queue.Empty:
+            pass
+        
+        if self.current_image_path is None and self.image_files:
+            self.load_current_image()
+        else:
+            self.update_image_info()
         
+        if not finished:
+            self.root.after(50, self.poll_scan)
+            return
+        self.scanning = False
+        self.seed_status_from_crops()
+        self.update_image_info()
+        print(f"Found {len(self.image_files)} images ({self.scanner.rescanned} folder(s) listed, "
+              f"the rest from the manifest), {self.progress.done} annotated")
+        if self.image_files and self.resume_image not in (None, self.image_files[self.current_image_index]):
+            self.status_label.config(text="Press L to resume where the last session stopped")
         if not self.image_files:
+            self.startup.report()
             messagebox.showwarning("Warning", f"No images found in '{self.INPUT_DIR}'!")
+    
+    def seed_status_from_crops(self):
+        """Mark images whose crops were saved before the annotation database as annotated (once)"""
+        if not self.image_files or self.annotation_db.get_session("crop_status_seeded"):
             return
-            
-        self.current_image_index = 0
-        self.load_current_image()
+        by_stem = {crop_name_stem(rel_path): rel_path for rel_path in self.image_files}
+        counts = {}
+        for _, relative in crop_files(self.OUTPUT_DIR):
+            match = CROP_NAME.match(os.path.splitext(os.path.basename(relative))[0])
+            rel_path = by_stem.get(match.group(1)) if match else None
+            if rel_path is not None:
+                counts[rel_path] = counts.get(rel_path, 0) + 1
+        self.annotation_db.seed_status({os.path.join(self.INPUT_DIR, rel_path): count
+                                        for rel_path, count in counts.items()})
+        self.annotation_db.set_session("crop_status_seeded", "1")
+        for rel_path in counts:
+            self.progress.mark_annotated(rel_path)
+        if counts:
+            print(f"Marked {len(counts)} image(s) with earlier crops as annotated")
+    
+    def apply_memory_budget(self):
+        """Split MEMORY_BUDGET_MB between the working image, decoded neighbours and pyramid tiles"""
+        budget = self.MEMORY_BUDGET_MB
+        # About 10% is left for the interface, crops in flight and the interpreter itself
+        self.WORKING_IMAGE_MB = int(budget * 0.35)
+        self.IMAGE_CACHE_MB = int(budget * 0.35)
+        self.TILE_CACHE_MB = int(budget * 0.2)
+        self.PREFETCH_AHEAD = 1
+        # Full-resolution pixels are memory-mapped from the raw cache, so it cannot be off
+        self.RAW_CACHE_MB = self.RAW_CACHE_MB or 2048
+        print(f"Memory budget {budget} MB: working image {self.WORKING_IMAGE_MB} MB, "
+              f"image cache {self.IMAGE_CACHE_MB} MB, tile cache {self.TILE_CACHE_MB} MB")
     
+    def loaded_image(self, img):
+        """Full-resolution pixels and view source for a decoded image (a memory map in budget mode)"""
+        if not self.MEMORY_BUDGET_MB:
+            return img, None
+        full = self.raw_cache.open(self.current_image_path)
+        if full is None:
+            # The raw file vanished since the working copy was made; hold this image in memory
+            full = decode_image(self.current_image_path)
+        return full, img
+    
+    def report_memory(self):
+        """Print peak RSS against the memory budget"""
+        peak = peak_rss_mb()
+        if peak is not None:
+            budget = f" of {self.MEMORY_BUDGET_MB} MB budget" if self.MEMORY_BUDGET_MB else ""
+            print(f"Peak RSS: {peak:.0f} MB{budget}")
+    
+    @traced()
     def load_current_image(self):
-        """Load the current image"""
+        """Load the current image, painting a reduced decode of large JPEGs first"""
         if not self.image_files:
             return
             
         image_path = os.path.join(self.INPUT_DIR, self.image_files[self.current_image_index])
         self.current_image_path = image_path
+        self.annotation_db.set_session("last_image", self.image_files[self.current_image_index])
         
-        # Load image with OpenCV
-        img = cv2.imread(image_path)
-        if img is None:
-            messagebox.showerror("Error", f"Could not load image: {image_path}")
-            return
+        # Use the full image if it was prefetched; otherwise show a preview (stored from an
+        # earlier visit, or a reduced JPEG decode) while it decodes
+        future = self.prefetcher.get_async(image_path)
+        preview = None
+        if not future.done():
+            preview = self.previews.get(image_path) or decode_preview(image_path, self.PREVIEW_MIN_SIDE)
+        if preview is None:
+            img = self.prefetcher.get(image_path)
+            if img is None:
+                messagebox.showerror("Error", f"Could not load image: {image_path}")
+                return
+            self.set_image(*self.loaded_image(img))
+        else:
+            preview_img, shape = preview
+            self.set_image(None, preview_img, shape)
+            self.full_image_future = future
+            self.root.after(20, self.poll_full_image, image_path)
+            print(f"Showing {preview_img.shape[1]}x{preview_img.shape[0]} preview, "
+                  f"decoding {shape[1]}x{shape[0]} in the background")
             
-        # Convert BGR to RGB
-        self.current_image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        self.prefetch_neighbours()
+        self.start_proposals()
+        stats = self.tile_cache.stats()
+        print(f"Tile cache: {stats['entries']} tiles, {stats['bytes'] / 1e6:.1f} MB, "
+              f"hit rate {stats['hit_rate']:.0%}")
         
         # Update UI
         self.update_image_info()
         self.reset_view()
         self.clear_boxes()
         self.display_image()
+        self.startup.mark("first image shown")
+        self.startup.report()
+        if self.MEMORY_BUDGET_MB:
+            self.report_memory()
+    
+    def set_image(self, image, view=None, shape=None):
+        """Show an image through `view`, a reduced copy (preview or working copy), if given
+
+        `image` holds the full-resolution pixels and may be None while they
+        are still decoding, in which case `shape` gives their size.
+        """
+        self.current_image = image
+        self.full_image_future = None
+        source = image if view is None else view
+        self.image_shape = tuple(image.shape[:2]) if image is not None else shape
+        key = self.current_image_path if view is None else f"{self.current_image_path}#{source.shape[1]}"
+        self.pyramid = ImagePyramid(source, self.tile_cache, key)
+        self.pyramid_scale = self.image_shape[1] / source.shape[1]
+        self.view_cache_key = None
+        self.view_array = None
+    
+    def poll_full_image(self, image_path):
+        """Swap in the full-resolution decode once the background worker finishes"""
+        if image_path != self.current_image_path or self.full_image_future is None:
+            return
+        if not self.full_image_future.done():
+            self.root.after(20, self.poll_full_image, image_path)
+            return
+        self.wait_for_full_image()
+    
+    def wait_for_full_image(self):
+        """Make sure the full-resolution pixels are loaded; False if the image cannot be read"""
+        if self.current_image is not None:
+            return True
+        future, self.full_image_future = self.full_image_future, None
+        img = None
+        if future is not None and not future.cancelled():
+            img = future.result()
+        if img is None:
+            img = self.prefetcher.get(self.current_image_path)
+        if img is None:
+            messagebox.showerror("Error", f"Could not load image: {self.current_image_path}")
+            return False
+        
+        # Same coordinate system, finer pixels: zoom, pan and annotations carry over
+        self.set_image(*self.loaded_image(img))
+        for annotation_id, kind, geometry in self.unhashed:
+            self.annotation_db.set_content_hash(annotation_id, annotation_hash(img, kind, geometry))
+        self.unhashed.clear()
+        self.display_image()
+        print(f"Full resolution loaded: {img.shape[1]}x{img.shape[0]}")
+        return True
+    
+    def add_annotation(self, kind, geometry):
+        """Persist a new annotation and show it; hashing waits for full-resolution pixels"""
+        content_hash = None if self.current_image is None else annotation_hash(self.current_image, kind, geometry)
+        annotation_id = self.annotation_db.add(self.current_image_path, kind, geometry, content_hash)
+        if self.current_image is None:
+            self.unhashed.append((annotation_id, kind, geometry))
+        index = self.annotations.add(kind, geometry, annotation_id)
+        self.overlay.add(index)
+        return index
+    
+    def prefetch_neighbours(self):
+        """Start decoding the images around the current one"""
+        paths = [self.current_image_path]
+        for step in range(1, max(self.PREFETCH_AHEAD, self.PREFETCH_BEHIND) + 1):
+            if step <= self.PREFETCH_AHEAD and self.current_image_index + step < len(self.image_files):
+                paths.append(os.path.join(self.INPUT_DIR, self.image_files[self.current_image_index + step]))
+            if step <= self.PREFETCH_BEHIND and self.current_image_index - step >= 0:
+                paths.append(os.path.join(self.INPUT_DIR, self.image_files[self.current_image_index - step]))
+        self.prefetcher.schedule(paths)
     
     def update_image_info(self):
         """Update image information display"""
-        if self.current_image is not None:
-            filename = os.path.basename(self.current_image_path)
-            progress = f"{self.current_image_index + 1} / {len(self.image_files)}"
+        if self.image_shape is not None:
+            filename = self.image_files[self.current_image_index]
+            progress = (f"{self.current_image_index + 1} / {len(self.image_files)}"
+                        f" · {self.progress.done} annotated")
+            if self.scanning:
+                progress += " (scanning...)"
             self.image_info_label.config(text=filename)
             self.progress_label.config(text=progress)
     
-    def display_image(self):
-        """Display the current image on canvas"""
-        if self.current_image is None:
+    def request_render(self):
+        """Schedule a draft render for the next frame and a refinement after input stops"""
+        self.render_requests += 1
+        if self.frame_after_id is None:
+            self.frame_after_id = self.root.after(self.FRAME_MS, self.render_frame)
+        if self.refine_after_id is not None:
+            self.root.after_cancel(self.refine_after_id)
+        self.refine_after_id = self.root.after(self.REFINE_DELAY_MS, self.refine_view)
+    
+    def render_frame(self):
+        """Render the coalesced view changes of the last frame"""
+        self.frame_after_id = None
+        TRACER.counter("render backlog", events=self.render_requests)
+        self.render_requests = 0
+        self.display_image(draft=True)
+    
+    def refine_view(self):
+        """Re-render the view at full quality once interaction has settled"""
+        self.refine_after_id = None
+        self.display_image()
+    
+    @traced()
+    def display_image(self, draft=False):
+        """Display the current image on canvas
+
+        A draft render uses nearest-neighbour sampling and, when only the pan
+        offset changed, shifts the previous render and fills the exposed strips.
+        """
+        if self.image_shape is None:
             return
 
         canvas_width = self.image_canvas.winfo_width()
@@ -558,29 +3549,55 @@ Free Shape Mode:
             self.root.after(100, self.display_image)
             return
 
-        h, w = self.current_image.shape[:2]
+        h, w = self.image_shape
 
         # Compute scaled dimensions
         scaled_w = int(w * self.zoom)
         scaled_h = int(h * self.zoom)
 
-        # Resize the image for display
-        resized_img = cv2.resize(self.current_image, (scaled_w, scaled_h), interpolation=cv2.INTER_LINEAR)
-
         # Determine the visible region (for panning)
         x1 = max(0, self.offset_x)
         y1 = max(0, self.offset_y)
         x2 = min(x1 + canvas_width, scaled_w)
         y2 = min(y1 + canvas_height, scaled_h)
 
-        # Crop the visible region
-        visible = resized_img[y1:y2, x1:x2]
+        # Only resample the visible region; reuse the last render if the view is unchanged
+        # (a draft request never replaces a full-quality render of the same view)
+        view_key = (id(self.pyramid.base), scaled_w, scaled_h, x1, y1, x2, y2)
+        if view_key != self.view_cache_key or (self.view_draft and not draft):
+            interpolation = cv2.INTER_NEAREST if draft else None
+            previous_key = self.view_cache_key
+            if (draft and self.view_array is not None and previous_key is not None
+                    and previous_key[:3] == view_key[:3]):
+                # Same image and zoom: only the pan offset moved
+                visible = self.pyramid.render_shifted(self.view_array, previous_key[3], previous_key[4],
+                                                      self.zoom * self.pyramid_scale, self.offset_x, self.offset_y,
+                                                      canvas_width, canvas_height, interpolation)
+            else:
+                visible = self.pyramid.render(self.zoom * self.pyramid_scale, self.offset_x, self.offset_y,
+                                              canvas_width, canvas_height, interpolation)
+            if visible is None:
+                self.photo = None
+            else:
+                # Convert to ImageTk, pasting into the existing photo when the size is unchanged
+                display_img = Image.fromarray(visible)
+                if self.photo is not None and (self.photo.width(), self.photo.height()) == display_img.size:
+                    self.photo.paste(display_img)
+                else:
+                    self.photo = ImageTk.PhotoImage(display_img)
+            self.view_array = visible
+            self.view_draft = draft
+            self.view_cache_key = view_key
 
-        # Convert to ImageTk
-        display_img = Image.fromarray(visible)
-        self.photo = ImageTk.PhotoImage(display_img)
-        self.image_canvas.delete("all")
-        self.image_canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        # Reuse the one image item; annotation items stay above it
+        if self.photo is None:
+            if self.image_item is not None:
+                self.image_canvas.itemconfigure(self.image_item, state='hidden')
+        elif self.image_item is None:
+            self.image_item = self.image_canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+            self.image_canvas.tag_lower(self.image_item)
+        else:
+            self.image_canvas.itemconfigure(self.image_item, image=self.photo, state='normal')
 
         # Store transformation data for coordinate conversion
         self.display_scale_x = scaled_w / w
@@ -588,8 +3605,9 @@ Free Shape Mode:
         self.display_x1 = x1
         self.display_y1 = y1
 
-        self.draw_boxes()
-        self.draw_polygons()
+        self.proposal_overlay.update(self.zoom, self.offset_x, self.offset_y, canvas_width, canvas_height)
+        self.overlay.update(self.zoom, self.offset_x, self.offset_y, canvas_width, canvas_height)
+        self.draw_polygon_points()
     
     def start_pan(self, event):
         """Start panning with right-click"""
@@ -606,8 +3624,8 @@ Free Shape Mode:
         new_offset_y = self.offset_y - dy
         
         # Ensure we don't pan beyond image boundaries
-        if self.current_image is not None:
-            h, w = self.current_image.shape[:2]
+        if self.image_shape is not None:
+            h, w = self.image_shape
             scaled_w = int(w * self.zoom)
             scaled_h = int(h * self.zoom)
             canvas_width = self.image_canvas.winfo_width()
@@ -621,65 +3639,16 @@ Free Shape Mode:
         
         self.pan_start_x = event.x
         self.pan_start_y = event.y
-        self.display_image()
-    
-    def draw_boxes(self):
-        """Draw all bounding boxes on the canvas"""
-        if not self.boxes:
-            return
-            
-        canvas_width = self.image_canvas.winfo_width()
-        canvas_height = self.image_canvas.winfo_height()
-        
-        for i, (x, y, w, h) in enumerate(self.boxes):
-            # Convert image coordinates to canvas coordinates
-            # First scale the box coordinates, then adjust for panning
-            scaled_x1 = x * self.zoom
-            scaled_y1 = y * self.zoom
-            scaled_x2 = (x + w) * self.zoom
-            scaled_y2 = (y + h) * self.zoom
-            
-            # Adjust for current pan offset
-            canvas_x1 = int(scaled_x1 - self.offset_x)
-            canvas_y1 = int(scaled_y1 - self.offset_y)
-            canvas_x2 = int(scaled_x2 - self.offset_x)
-            canvas_y2 = int(scaled_y2 - self.offset_y)
-            
-            # Only draw if box is visible
-            if (canvas_x2 > 0 and canvas_x1 < canvas_width and 
-                canvas_y2 > 0 and canvas_y1 < canvas_height):
-                
-                self.image_canvas.create_rectangle(
-                    canvas_x1, canvas_y1, canvas_x2, canvas_y2,
-                    outline='#00FF00', width=2, tags=f"box_{i}"
-                )
-                # Add box number
-                self.image_canvas.create_text(
-                    canvas_x1 + 5, canvas_y1 + 5,
-                    text=str(i+1), fill='#00FF00', font=('Arial', 12, 'bold'),
-                    tags=f"box_text_{i}"
-                )
+        self.request_render()
     
     def on_canvas_click(self, event):
         """Handle canvas click"""
         if self.free_shape_mode:
-            # Add point to polygon
-            self.polygon_points.append((event.x, event.y))
-            print(f"Added point {len(self.polygon_points)}: ({event.x}, {event.y})")
-            
-            # Draw the point
-            self.image_canvas.create_oval(
-                event.x - 3, event.y - 3, event.x + 3, event.y + 3,
-                fill='#00FF00', outline='#00FF00', tags="polygon_point"
-            )
-            
-            # Draw line to previous point if exists
-            if len(self.polygon_points) > 1:
-                prev_x, prev_y = self.polygon_points[-2]
-                self.image_canvas.create_line(
-                    prev_x, prev_y, event.x, event.y,
-                    fill='#00FF00', width=2, tags="polygon_line"
-                )
+            # Add point to polygon (kept in image coordinates so it follows pan and zoom)
+            point = self.canvas_to_image(event.x, event.y)
+            self.polygon_points.append(point)
+            print(f"Added point {len(self.polygon_points)}: {point}")
+            self.draw_polygon_points()
         else:
             # Normal rectangle mode
             self.start_x = event.x
@@ -704,7 +3673,7 @@ Free Shape Mode:
             self.drawing = False
             self.image_canvas.delete("temp_box")
 
-            if self.current_image is None:
+            if self.image_shape is None:
                 return
 
             # Convert canvas coordinates → original image coordinates
@@ -713,31 +3682,32 @@ Free Shape Mode:
             x2 = max(self.start_x, event.x)
             y2 = max(self.start_y, event.y)
 
-            # Convert canvas coordinates to scaled image coordinates
-            # Add the pan offset to get the position in the scaled image
-            scaled_x1 = x1 + self.offset_x
-            scaled_y1 = y1 + self.offset_y
-            scaled_x2 = x2 + self.offset_x
-            scaled_y2 = y2 + self.offset_y
-
-            # Convert scaled coordinates back to original image coordinates
-            img_x1 = int(scaled_x1 / self.zoom)
-            img_y1 = int(scaled_y1 / self.zoom)
-            img_x2 = int(scaled_x2 / self.zoom)
-            img_y2 = int(scaled_y2 / self.zoom)
+            # Convert canvas coordinates back to original image coordinates
+            (img_x1, img_y1), (img_x2, img_y2) = AnnotationStore.from_canvas(
+                [(x1, y1), (x2, y2)], self.zoom, self.offset_x, self.offset_y).tolist()
 
             # Clip to image bounds
-            h, w = self.current_image.shape[:2]
+            h, w = self.image_shape
             img_x1 = max(0, min(w, img_x1))
             img_y1 = max(0, min(h, img_y1))
             img_x2 = max(0, min(w, img_x2))
             img_y2 = max(0, min(h, img_y2))
 
             if abs(img_x2 - img_x1) > 10 and abs(img_y2 - img_y1) > 10:
-                self.boxes.append((img_x1, img_y1, img_x2 - img_x1, img_y2 - img_y1))
+                box = (img_x1, img_y1, img_x2 - img_x1, img_y2 - img_y1)
+                self.suggest_codes([self.add_annotation("box", box)])
                 self.display_image()
                 print(f"Added box: ({img_x1},{img_y1}) to ({img_x2},{img_y2})")
     
+    def min_zoom(self):
+        """Smallest zoom: 0.5, or less if needed to fit the whole image in the canvas"""
+        if self.image_shape is None:
+            return 0.5
+        h, w = self.image_shape
+        canvas_width = max(1, self.image_canvas.winfo_width())
+        canvas_height = max(1, self.image_canvas.winfo_height())
+        return min(0.5, canvas_width / w, canvas_height / h)
+    
     def on_canvas_scroll(self, event):
         """Handle canvas scroll for zooming"""
         if event.delta > 0 or event.num == 4:  # Zoom in
@@ -745,20 +3715,20 @@ Free Shape Mode:
         else:  # Zoom out
             self.zoom /= 1.1
             
-        self.zoom = max(0.5, min(self.zoom, 5.0))
-        self.display_image()
+        self.zoom = max(self.min_zoom(), min(self.zoom, 5.0))
+        self.request_render()
     
     def zoom_in(self):
         """Zoom in"""
         self.zoom *= 1.2
         self.zoom = min(self.zoom, 5.0)
-        self.display_image()
+        self.request_render()
     
     def zoom_out(self):
         """Zoom out"""
         self.zoom /= 1.2
-        self.zoom = max(self.zoom, 0.5)
-        self.display_image()
+        self.zoom = max(self.zoom, self.min_zoom())
+        self.request_render()
     
     def reset_view(self):
         """Reset zoom and pan"""
@@ -769,43 +3739,45 @@ Free Shape Mode:
     
     def pan_left(self):
         """Pan the image left (move view right)"""
-        if self.current_image is not None:
+        if self.image_shape is not None:
             self.offset_x = max(0, self.offset_x - 50)
-            self.display_image()
+            self.request_render()
     
     def pan_right(self):
         """Pan the image right (move view left)"""
-        if self.current_image is not None:
-            h, w = self.current_image.shape[:2]
+        if self.image_shape is not None:
+            h, w = self.image_shape
             scaled_w = int(w * self.zoom)
             canvas_width = self.image_canvas.winfo_width()
             max_offset_x = max(0, scaled_w - canvas_width)
             self.offset_x = min(self.offset_x + 50, max_offset_x)
-            self.display_image()
+            self.request_render()
     
     def pan_up(self):
         """Pan the image up (move view down)"""
-        if self.current_image is not None:
+        if self.image_shape is not None:
             self.offset_y = max(0, self.offset_y - 50)
-            self.display_image()
+            self.request_render()
     
     def pan_down(self):
         """Pan the image down (move view up)"""
-        if self.current_image is not None:
-            h, w = self.current_image.shape[:2]
+        if self.image_shape is not None:
+            h, w = self.image_shape
             scaled_h = int(h * self.zoom)
             canvas_height = self.image_canvas.winfo_height()
             max_offset_y = max(0, scaled_h - canvas_height)
             self.offset_y = min(self.offset_y + 50, max_offset_y)
-            self.display_image()
+            self.request_render()
     
     def clear_boxes(self):
         """Clear all bounding boxes"""
-        self.boxes.clear()
+        self.annotations.clear()
         self.display_image()
     
     def on_key_press(self, event):
         """Handle keyboard shortcuts"""
+        if event.keysym in self.TYPING_KEYS and isinstance(event.widget, (tk.Entry, ttk.Entry)):
+            return
         if event.keysym == 'n':
             self.next_image()
         elif event.keysym == 'p':
@@ -818,6 +3790,26 @@ Free Shape Mode:
             self.save_current_symbol()
         elif event.keysym == 'f':
             self.toggle_free_shape()
+        elif event.keysym == 'a':
+            self.accept_proposals()
+        elif event.keysym == 'A':
+            self.accept_proposals(accept_all=True)
+        elif event.keysym == 'i':
+            self.find_similar()
+        elif event.keysym == 'Escape':
+            self.cancel_find()
+        elif event.keysym == 'F2':
+            self.toggle_hud()
+        elif event.keysym == 'F3':
+            self.export_trace()
+        elif event.keysym == 'u':
+            self.next_unannotated()
+        elif event.keysym == 'l':
+            self.resume()
+        elif event.keysym == 'Delete':
+            self.delete_annotation_under_pointer()
+        elif event.keysym in '123456789' and len(event.keysym) == 1:
+            self.choose_suggestion(int(event.keysym) - 1)
         elif event.keysym == 'Left':
             self.pan_left()
         elif event.keysym == 'Right':
@@ -859,63 +3851,245 @@ Free Shape Mode:
     def complete_polygon(self):
         """Complete the current polygon"""
         if len(self.polygon_points) > 2:
-            # Close the polygon by connecting to the first point
-            first_x, first_y = self.polygon_points[0]
-            last_x, last_y = self.polygon_points[-1]
-            
-            # Draw the closing line
-            self.image_canvas.create_line(
-                last_x, last_y, first_x, first_y,
-                fill='#00FF00', width=2, tags="polygon_line"
-            )
-            
             # Add to completed polygons
-            self.polygons.append(self.polygon_points.copy())
+            img_polygon = self.polygon_points.copy()
+            self.suggest_codes([self.add_annotation("polygon", img_polygon)])
             self.polygon_points.clear()
             
-            # Clear temporary drawing elements
-            self.image_canvas.delete("polygon_point")
-            self.image_canvas.delete("polygon_line")
-            
             # Redraw to show completed polygon
             self.display_image()
-            print(f"Completed polygon with {len(self.polygons[-1])} points")
+            print(f"Completed polygon with {len(img_polygon)} points")
         else:
             print("Need at least 3 points to complete a polygon")
     
-    def draw_polygons(self):
-        """Draw all completed polygons"""
-        for i, polygon in enumerate(self.polygons):
-            if len(polygon) > 2:
-                # Draw the polygon outline
-                self.image_canvas.create_polygon(
-                    polygon, outline='#00FF00', width=2, fill="",
-                    tags=f"polygon_{i}"
+    def draw_polygon_points(self):
+        """Draw the points and edges of the polygon being drawn"""
+        self.image_canvas.delete("polygon_point")
+        self.image_canvas.delete("polygon_line")
+        points = AnnotationStore.to_canvas(np.array(self.polygon_points).reshape(-1, 2),
+                                           self.zoom, self.offset_x, self.offset_y).tolist()
+        for i, (x, y) in enumerate(points):
+            self.image_canvas.create_oval(
+                x - 3, y - 3, x + 3, y + 3,
+                fill='#00FF00', outline='#00FF00', tags="polygon_point"
+            )
+            # Draw line to previous point if exists
+            if i > 0:
+                prev_x, prev_y = points[i - 1]
+                self.image_canvas.create_line(
+                    prev_x, prev_y, x, y,
+                    fill='#00FF00', width=2, tags="polygon_line"
                 )
-                
-                # Add polygon number
-                if polygon:
-                    x, y = polygon[0]
-                    self.image_canvas.create_text(
-                        x + 5, y + 5, text=f"P{i+1}", fill='#00FF00',
-                        font=('Arial', 12, 'bold'), tags=f"polygon_text_{i}"
-                    )
     
     def clear_boxes(self):
         """Clear all bounding boxes and polygons"""
-        self.boxes.clear()
-        self.polygons.clear()
+        indices = self.annotations.indices()
+        self.annotation_db.discard_unlabelled(self.annotations.ids[indices].tolist())
+        self.annotations.clear()
+        self.unhashed.clear()
         self.polygon_points.clear()
+        self.overlay.clear()
+        self.show_suggestions([])
         self.image_canvas.delete("polygon_point")
         self.image_canvas.delete("polygon_line")
         self.display_image()
         print("All annotations cleared")
     
+    def canvas_to_image(self, x, y):
+        """Convert a canvas point to image coordinates using the current view"""
+        (img_x, img_y), = AnnotationStore.from_canvas([(x, y)], self.zoom, self.offset_x, self.offset_y).tolist()
+        return img_x, img_y
+    
+    def pointer_image_position(self):
+        """Image coordinates under the mouse pointer, or None if it is outside the canvas"""
+        canvas_x = self.image_canvas.winfo_pointerx() - self.image_canvas.winfo_rootx()
+        canvas_y = self.image_canvas.winfo_pointery() - self.image_canvas.winfo_rooty()
+        if not (0 <= canvas_x < self.image_canvas.winfo_width() and 0 <= canvas_y < self.image_canvas.winfo_height()):
+            return None
+        return self.canvas_to_image(canvas_x, canvas_y)
+    
+    def start_proposals(self):
+        """Propose glyph boxes for the current image in the background (cancels the previous image's job)"""
+        self.proposals.clear()
+        self.proposal_overlay.clear()
+        self.proposal_future = None
+        self.find_future = None
+        if not self.SHOW_PROPOSALS:
+            self.proposer.cancel()
+            return
+        # The view source (preview or working copy) is plenty for proposals
+        self.proposal_future = self.proposer.request(self.current_image_path, self.pyramid.base, self.pyramid_scale)
+        self.poll_proposals(self.current_image_path)
+    
+    def poll_proposals(self, image_path):
+        """Show the proposals as ghost boxes once they are ready"""
+        future = self.proposal_future
+        if future is None or image_path != self.current_image_path:
+            return
+        if not future.done():
+            self.root.after(50, self.poll_proposals, image_path)
+            return
+        self.proposal_future = None
+        boxes = None if future.cancelled() else future.result()
+        if boxes is None or not len(boxes):
+            return
+        
+        # Skip regions that were already annotated in an earlier session
+        saved = [(row["x1"], row["y1"], row["x2"], row["y2"]) for row in self.annotation_db.annotations_for_image(image_path)]
+        if saved:
+            boxes = boxes[box_iou(boxes, saved).max(axis=1) <= 0.3]
+        for x1, y1, x2, y2 in boxes.tolist():
+            self.proposal_overlay.add(self.proposals.add("box", (x1, y1, x2 - x1, y2 - y1)))
+        self.display_image()
+        self.status_label.config(text=f"{len(boxes)} proposed boxes: A accepts the one under the mouse, "
+                                      f"Shift+A accepts all")
+    
+    def find_similar(self):
+        """Search the image for other instances of an annotation and show them as ghost boxes
+
+        The template is the annotation under the mouse pointer, else the
+        last one drawn, else the last one saved for this image (whose code
+        is then offered as suggestion 1). Polygons use their bounding box.
+        """
+        if self.image_shape is None:
+            return
+        code = None
+        position = self.pointer_image_position()
+        hits = self.annotations.hit_test(*position) if position is not None else []
+        indices = self.annotations.indices()
+        if hits or len(indices):
+            x1, y1, x2, y2 = self.annotations.bounds[hits[0] if hits else indices[-1]].tolist()
+        else:
+            saved = self.annotation_db.annotations_for_image(self.current_image_path)
+            if not saved:
+                messagebox.showwarning("Warning", "Draw or point at a box to search for first!")
+                return
+            row = saved[-1]
+            x1, y1, x2, y2, code = row["x1"], row["y1"], row["x2"], row["y2"], row["code"]
+        
+        # Full-resolution pixels when decoded, otherwise the preview or working copy; in memory
+        # budget mode the full pixels are a memory map that resizing would page in whole
+        if self.current_image is not None and not self.MEMORY_BUDGET_MB:
+            image, scale = self.current_image, 1.0
+        else:
+            image, scale = self.pyramid.base, self.pyramid_scale
+        # The search replaces the proposals: their job is cancelled by proposer.find
+        self.proposals.clear()
+        self.proposal_overlay.clear()
+        self.proposal_future = None
+        self.find_future = self.proposer.find(image, (x1, y1, x2, y2), scale,
+                                              threshold=self.FIND_THRESHOLD, angles=self.FIND_ANGLES)
+        self.find_code = code
+        self.status_label.config(text="Searching for similar glyphs... (Esc to stop)")
+        self.poll_find(self.find_future, self.current_image_path, time.perf_counter())
+    
+    def poll_find(self, future, image_path, started):
+        """Show the matches of a find-similar search as ghost boxes once it finishes"""
+        if future is not self.find_future or image_path != self.current_image_path:
+            return  # Superseded by another search or image
+        if not future.done():
+            self.root.after(50, self.poll_find, future, image_path, started)
+            return
+        self.find_future = None
+        result = None if future.cancelled() else future.result()
+        if result is None:
+            self.status_label.config(text="Search stopped")
+            return
+        boxes, _ = result
+        
+        # Drop the template itself and anything already annotated
+        existing = [self.annotations.bounds[i].tolist() for i in self.annotations.indices().tolist()]
+        existing += [(row["x1"], row["y1"], row["x2"], row["y2"])
+                     for row in self.annotation_db.annotations_for_image(image_path)]
+        if existing and len(boxes):
+            boxes = boxes[box_iou(boxes, existing).max(axis=1) <= 0.3]
+        for x1, y1, x2, y2 in boxes.tolist():
+            self.proposal_overlay.add(self.proposals.add("box", (x1, y1, x2 - x1, y2 - y1)))
+        self.display_image()
+        if self.find_code is not None:
+            self.show_suggestions([(self.find_code, 1.0)])
+        self.status_label.config(text=f"{len(boxes)} similar glyph(s) in {time.perf_counter() - started:.1f}s: "
+                                      f"A accepts the one under the mouse, Shift+A accepts all")
+    
+    def cancel_find(self):
+        """Stop a running find-similar search"""
+        if self.find_future is not None:
+            self.proposer.cancel()
+    
+    def accept_proposals(self, accept_all=False):
+        """Turn the ghost box under the mouse pointer (or every ghost box) into annotations"""
+        if accept_all:
+            indices = self.proposals.indices().tolist()
+        else:
+            position = self.pointer_image_position()
+            indices = self.proposals.hit_test(*position)[:1] if position is not None else []
+        added = []
+        for index in indices:
+            added.append(self.add_annotation("box", self.proposals.geometry(index)))
+            self.proposals.remove(index)
+            self.proposal_overlay.remove(index)
+        if indices:
+            self.suggest_codes(added)
+            self.display_image()
+            print(f"Accepted {len(indices)} proposed box(es)")
+    
+    def delete_annotation_under_pointer(self):
+        """Remove the most recently drawn annotation under the mouse pointer"""
+        position = self.pointer_image_position()
+        if position is None:
+            return
+        hits = self.annotations.hit_test(*position)
+        if not hits:
+            return
+        index = hits[0]
+        self.annotation_db.discard_unlabelled([int(self.annotations.ids[index])])
+        self.annotations.remove(index)
+        self.overlay.remove(index)
+        self.display_image()
+        print(f"Removed {self.annotations.kind(index)} {self.annotations.label(index)}")
+    
+    def suggest_codes(self, indices):
+        """Show the codes of saved crops most similar to the given annotations"""
+        if not self.SUGGESTIONS or self.current_image is None:
+            return
+        crops = [render_crop(self.current_image, self.annotations.kind(i), self.annotations.geometry(i), self.SAVE_SIZE)
+                 for i in indices]
+        crops = [crop for crop in crops if crop is not None]
+        self.show_suggestions(self.suggestions.suggest(crops, self.SUGGESTIONS))
+    
+    def show_suggestions(self, suggestions):
+        """List (code, score) suggestions as numbered one-key choices"""
+        self.suggested_codes = [code for code, _ in suggestions]
+        text = "   ".join(f"{i + 1}: {code} {score:.0%}" for i, (code, score) in enumerate(suggestions))
+        self.suggestion_label.config(text=f"💡 {text}" if text else "")
+    
+    def choose_suggestion(self, n):
+        """Select the n-th suggested code in the symbol list"""
+        if n >= len(self.suggested_codes):
+            return
+        code = self.suggested_codes[n]
+        if code not in self.filtered_symbols or self.populate_after_id is not None:
+            # Show the full list so the code has a row to select
+            self.search_var.set("")
+            if self.search_after_id is not None:
+                self.root.after_cancel(self.search_after_id)
+            self.filter_categories()
+        if code not in self.filtered_symbols:
+            return
+        row = self.filtered_symbols.index(code)
+        self.category_listbox.selection_clear(0, tk.END)
+        self.category_listbox.selection_set(row)
+        self.category_listbox.see(row)
+        self.on_category_select(None)
+    
+    @traced()
     def save_current_symbol(self):
         """Save the currently selected symbol"""
-        if not self.boxes and not self.polygons:
+        if not len(self.annotations):
             messagebox.showwarning("Warning", "No annotations to save!")
             return
+        if not self.wait_for_full_image():
+            return
             
         # Get selected category
         selection = self.category_listbox.curselection()
@@ -923,10 +4097,8 @@ Free Shape Mode:
             messagebox.showwarning("Warning", "Please select a category first!")
             return
             
-        # Get the actual symbol index
-        search_text = self.search_var.get().lower()
-        filtered_symbols = [symbol for symbol in self.GARDINER_CATEGORIES 
-                          if search_text in symbol.lower() or search_text in self.SYMBOL_DESCRIPTIONS.get(symbol, "").lower()]
+        # Get the actual symbol from the filtered list
+        filtered_symbols = self.filtered_symbols
         if selection[0] >= len(filtered_symbols):
             messagebox.showwarning("Warning", "Invalid symbol selection!")
             return
@@ -935,111 +4107,54 @@ Free Shape Mode:
         symbol_description = self.SYMBOL_DESCRIPTIONS.get(selected_symbol, "Unknown")
         category_code = selected_symbol
         
-        # Save all boxes and polygons
-        saved_count = 0
-        
-        # Save bounding boxes
-        for i, (x, y, w, h) in enumerate(self.boxes):
-            # Ensure coordinates are within image bounds
-            img_h, img_w = self.current_image.shape[:2]
-            x1 = max(0, min(x, img_w))
-            y1 = max(0, min(y, img_h))
-            x2 = max(0, min(x + w, img_w))
-            y2 = max(0, min(y + h, img_h))
-            
-            # Skip if box is invalid
-            if x2 <= x1 or y2 <= y1:
-                continue
-                
-            # Extract symbol from original image
-            symbol_crop = self.current_image[y1:y2, x1:x2]
-            
-            # Convert to PIL Image and resize to standard size
-            symbol_img = Image.fromarray(symbol_crop)
-            symbol_img = symbol_img.resize(self.SAVE_SIZE, Image.Resampling.LANCZOS)
-            
-            # Save
-            filename = f"{os.path.splitext(self.image_files[self.current_image_index])[0]}_box_{i:03d}.png"
-            save_path = os.path.join(self.OUTPUT_DIR, category_code, filename)
-            symbol_img.save(save_path)
-            print(f"Saved Box {i+1}: ({x1},{y1}) to ({x2},{y2}) - Size: {x2-x1}x{y2-y1} -> {save_path}")
-            saved_count += 1
-        
-        # Save polygons as actual selected areas
-        for i, polygon in enumerate(self.polygons):
-            if len(polygon) > 2:
-                # Convert canvas coordinates to image coordinates
-                img_polygon = []
-                for point in polygon:
-                    img_x = int((point[0] + self.offset_x) / self.zoom)
-                    img_y = int((point[1] + self.offset_y) / self.zoom)
-                    img_polygon.append((img_x, img_y))
-                
-                # Get bounding box for the crop area
-                x_coords = [point[0] for point in img_polygon]
-                y_coords = [point[1] for point in img_polygon]
-                min_x = min(x_coords)
-                max_x = max(x_coords)
-                min_y = min(y_coords)
-                max_y = max(y_coords)
-                
-                # Clip to image bounds
-                h, w = self.current_image.shape[:2]
-                min_x = max(0, min(w, min_x))
-                min_y = max(0, min(h, min_y))
-                max_x = max(0, min(w, max_x))
-                max_y = max(0, min(h, max_y))
-                
-                if max_x > min_x and max_y > min_y:
-                    # Create a mask for the polygon
-                    mask = Image.new('L', (w, h), 0)
-                    mask_draw = ImageDraw.Draw(mask)
-                    
-                    # Draw the polygon on the mask
-                    mask_draw.polygon(img_polygon, fill=255)
-                    
-                    # Crop the mask to the bounding box
-                    mask_crop = mask.crop((min_x, min_y, max_x, max_y))
-                    
-                    # Crop the image to the bounding box
-                    symbol_crop = self.current_image[min_y:max_y, min_x:max_x]
-                    symbol_img = Image.fromarray(symbol_crop)
-                    
-                    # Apply the mask to get only the polygon area
-                    # Create a transparent background
-                    result_img = Image.new('RGBA', symbol_img.size, (0, 0, 0, 0))
-                    
-                    # Convert the original image to RGBA if needed
-                    if symbol_img.mode != 'RGBA':
-                        symbol_img = symbol_img.convert('RGBA')
-                    
-                    # Apply the mask
-                    for y in range(symbol_img.height):
-                        for x in range(symbol_img.width):
-                            if mask_crop.getpixel((x, y)) > 0:  # If pixel is inside polygon
-                                result_img.putpixel((x, y), symbol_img.getpixel((x, y)))
-                    
-                    # Resize to standard size
-                    result_img = result_img.resize(self.SAVE_SIZE, Image.Resampling.LANCZOS)
-                    
-                    # Save
-                    filename = f"{os.path.splitext(self.image_files[self.current_image_index])[0]}_polygon_{i:03d}.png"
-                    save_path = os.path.join(self.OUTPUT_DIR, category_code, filename)
-                    result_img.save(save_path)
-                    print(f"Saved Polygon {i+1}: Actual polygon shape ({min_x},{min_y}) to ({max_x},{max_y}) - Size: {max_x-min_x}x{max_y-min_y} -> {save_path}")
-                    saved_count += 1
-        
-        if saved_count > 0:
-            messagebox.showinfo("Success", f"Saved {saved_count} annotation(s) to category '{selected_symbol} - {symbol_description}'")
+        # Queue all boxes and polygons for the background saver
+        img_h, img_w = self.image_shape
+        base_name = crop_name_stem(self.image_files[self.current_image_index])
+        jobs = []
+        
+        # Boxes, then polygons as actual selected areas (skip annotations that are empty once clipped)
+        indices, _, valid = self.annotations.clipped_bounds(img_w, img_h)
+        indices = indices[valid]
+        indices = indices[np.argsort(self.annotations.kinds[indices], kind="stable")]
+        for index in indices.tolist():
+            kind = self.annotations.kind(index)
+            # The save worker appends the content hash, so batches never overwrite each other
+            save_path = os.path.join(self.OUTPUT_DIR, category_code, f"{base_name}_{kind}.png")
+            jobs.append(SaveJob(self.current_image, self.current_image_path, kind, self.annotations.geometry(index),
+                                category_code, save_path, self.SAVE_SIZE, int(self.annotations.ids[index])))
+        
+        if jobs:
+            self.annotation_db.set_code([job.annotation_id for job in jobs], category_code)
+            self.progress.mark_annotated(self.image_files[self.current_image_index])
+            self.update_image_info()
+            self.save_worker.submit(f"{selected_symbol} - {symbol_description}", jobs)
+            self.status_label.config(text=f"Saving {len(jobs)} annotation(s) to '{selected_symbol}'...")
             self.clear_boxes()
         else:
             messagebox.showwarning("Warning", "No valid annotations to save!")
     
+    def poll_save_progress(self):
+        """Report background save progress in the status area"""
+        pending = self.save_worker.pending()
+        for batch in self.save_worker.pop_finished():
+            text = f"Saved {batch.done} annotation(s) to '{batch.label}'"
+            if batch.duplicates:
+                text += f" ({batch.duplicates} already saved)"
+            if batch.failed:
+                text += f" ({batch.failed} failed)"
+            self.status_label.config(text=text)
+        if pending:
+            self.status_label.config(text=f"Saving... {pending} annotation(s) left")
+        self.root.after(200, self.poll_save_progress)
+    
+    @traced()
     def preview_boxes(self):
         """Preview what will be saved from each annotation"""
-        if not self.boxes and not self.polygons:
+        if not len(self.annotations):
             messagebox.showwarning("Warning", "No annotations to preview!")
             return
+        if not self.wait_for_full_image():
+            return
         
         # Create preview window
         preview_window = tk.Toplevel(self.root)
@@ -1060,24 +4175,13 @@ Free Shape Mode:
         canvas.configure(yscrollcommand=scrollbar.set)
         
         # Show each bounding box
-        for i, (x, y, w, h) in enumerate(self.boxes):
-            # Ensure coordinates are within image bounds
-            img_h, img_w = self.current_image.shape[:2]
-            x1 = max(0, min(x, img_w))
-            y1 = max(0, min(y, img_h))
-            x2 = max(0, min(x + w, img_w))
-            y2 = max(0, min(y + h, img_h))
-            
-            if x2 <= x1 or y2 <= y1:
+        for i in self.annotations.indices("box").tolist():
+            box = self.annotations.geometry(i)
+            # Extract symbol (clipped to image bounds), resized for preview (max 200px)
+            result = preview_thumbnail(self.current_image, "box", box)
+            if result is None:
                 continue
-                
-            # Extract symbol
-            symbol_crop = self.current_image[y1:y2, x1:x2]
-            symbol_img = Image.fromarray(symbol_crop)
-            
-            # Resize for preview (max 200px)
-            max_size = 200
-            symbol_img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            symbol_img, (x1, y1, x2, y2) = result
             
             # Convert to PhotoImage
             photo = ImageTk.PhotoImage(symbol_img)
@@ -1087,86 +4191,56 @@ Free Shape Mode:
             box_frame.pack(fill=tk.X, padx=10, pady=5)
             
             # Label and image
-            ttk.Label(box_frame, text=f"Box {i+1}: ({x1},{y1}) to ({x2},{y2}) - Size: {x2-x1}x{y2-y1}").pack(anchor=tk.W)
-            print(f"Preview Box {i+1}: Original coords ({x},{y},{w},{h}) -> Final coords ({x1},{y1}) to ({x2},{y2})")  # Debug
+            ttk.Label(box_frame, text=f"Box {self.annotations.label(i)}: ({x1},{y1}) to ({x2},{y2}) - Size: {x2-x1}x{y2-y1}").pack(anchor=tk.W)
+            print(f"Preview Box {self.annotations.label(i)}: Original coords {box} -> Final coords ({x1},{y1}) to ({x2},{y2})")  # Debug
             img_label = ttk.Label(box_frame, image=photo)
             img_label.image = photo  # Keep a reference
             img_label.pack(anchor=tk.W)
         
         # Show each polygon as actual selected area
-        for i, polygon in enumerate(self.polygons):
+        for i in self.annotations.indices("polygon").tolist():
+            polygon = self.annotations.geometry(i)
             if len(polygon) > 2:
-                # Convert canvas coordinates to image coordinates
-                img_polygon = []
-                for point in polygon:
-                    img_x = int((point[0] + self.offset_x) / self.zoom)
-                    img_y = int((point[1] + self.offset_y) / self.zoom)
-                    img_polygon.append((img_x, img_y))
+                # Cut the polygon out on a transparent background, resized for preview (max 200px)
+                result = preview_thumbnail(self.current_image, "polygon", polygon)
+                if result is None:
+                    continue
+                result_img, (min_x, min_y, max_x, max_y) = result
                 
-                # Get bounding box for the crop area
-                x_coords = [point[0] for point in img_polygon]
-                y_coords = [point[1] for point in img_polygon]
-                min_x = min(x_coords)
-                max_x = max(x_coords)
-                min_y = min(y_coords)
-                max_y = max(y_coords)
+                # Convert to PhotoImage
+                photo = ImageTk.PhotoImage(result_img)
                 
-                # Clip to image bounds
-                h, w = self.current_image.shape[:2]
-                min_x = max(0, min(w, min_x))
-                min_y = max(0, min(h, min_y))
-                max_x = max(0, min(w, max_x))
-                max_y = max(0, min(h, max_y))
+                # Create frame for this preview
+                poly_frame = ttk.Frame(scrollable_frame)
+                poly_frame.pack(fill=tk.X, padx=10, pady=5)
                 
-                if max_x > min_x and max_y > min_y:
-                    # Create a mask for the polygon
-                    mask = Image.new('L', (w, h), 0)
-                    mask_draw = ImageDraw.Draw(mask)
-                    
-                    # Draw the polygon on the mask
-                    mask_draw.polygon(img_polygon, fill=255)
-                    
-                    # Crop the mask to the bounding box
-                    mask_crop = mask.crop((min_x, min_y, max_x, max_y))
-                    
-                    # Crop the image to the bounding box
-                    symbol_crop = self.current_image[min_y:max_y, min_x:max_x]
-                    symbol_img = Image.fromarray(symbol_crop)
-                    
-                    # Apply the mask to get only the polygon area
-                    # Create a transparent background
-                    result_img = Image.new('RGBA', symbol_img.size, (0, 0, 0, 0))
-                    
-                    # Convert the original image to RGBA if needed
-                    if symbol_img.mode != 'RGBA':
-                        symbol_img = symbol_img.convert('RGBA')
-                    
-                    # Apply the mask
-                    for y in range(symbol_img.height):
-                        for x in range(symbol_img.width):
-                            if mask_crop.getpixel((x, y)) > 0:  # If pixel is inside polygon
-                                result_img.putpixel((x, y), symbol_img.getpixel((x, y)))
-                    
-                    # Resize for preview (max 200px)
-                    max_size = 200
-                    result_img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                    
-                    # Convert to PhotoImage
-                    photo = ImageTk.PhotoImage(result_img)
-                    
-                    # Create frame for this preview
-                    poly_frame = ttk.Frame(scrollable_frame)
-                    poly_frame.pack(fill=tk.X, padx=10, pady=5)
-                    
-                    # Label and image
-                    ttk.Label(poly_frame, text=f"Polygon {i+1}: Actual selected shape ({min_x},{min_y}) to ({max_x},{max_y}) - Size: {max_x-min_x}x{max_y-min_y} - Points: {len(polygon)}").pack(anchor=tk.W)
-                    img_label = ttk.Label(poly_frame, image=photo)
-                    img_label.image = photo  # Keep a reference
-                    img_label.pack(anchor=tk.W)
+                # Label and image
+                ttk.Label(poly_frame, text=f"Polygon {self.annotations.ordinals[i] + 1}: Actual selected shape ({min_x},{min_y}) to ({max_x},{max_y}) - Size: {max_x-min_x}x{max_y-min_y} - Points: {len(polygon)}").pack(anchor=tk.W)
+                img_label = ttk.Label(poly_frame, image=photo)
+                img_label.image = photo  # Keep a reference
+                img_label.pack(anchor=tk.W)
         
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
     
+    def next_unannotated(self):
+        """Go to the next image without saved annotations"""
+        index = self.progress.next_unannotated(self.current_image_index)
+        if index is None:
+            messagebox.showinfo("Info", "Every image has been annotated!")
+            return
+        self.current_image_index = index
+        self.load_current_image()
+    
+    def resume(self):
+        """Go back to the image the last session ended on"""
+        index = self.progress.index_of(self.resume_image) if self.resume_image else None
+        if index is None:
+            messagebox.showinfo("Info", "The last session's image has not been found (yet)")
+            return
+        self.current_image_index = index
+        self.load_current_image()
+    
     def next_image(self):
         """Go to next image"""
         if self.current_image_index < len(self.image_files) - 1:
@@ -1190,10 +4264,230 @@ Free Shape Mode:
         else:
             messagebox.showwarning("Warning", "Output directory does not exist!")
 
-def main():
+    def on_close(self):
+        """Stop background workers and close the window"""
+        if self.scanner is not None:
+            self.scanner.stop()
+        self.prefetcher.shutdown()
+        self.proposer.shutdown()
+        pending = self.save_worker.pending()
+        if pending:
+            print(f"Waiting for {pending} annotation(s) to be saved...")
+        self.save_worker.close()
+        self.annotation_db.close()
+        self.report_memory()
+        self.watchdog.stop()
+        print("Timings:\n  " + "\n  ".join(TRACER.summary()))
+        if self.TRACE_PATH:
+            print(f"Wrote {TRACER.export(self.TRACE_PATH)} trace events to {self.TRACE_PATH}")
+        self.root.destroy()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hieroglyph annotator")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB",
+                        help="Keep peak memory near this many MB: the viewer shows a downsampled "
+                             "working copy and crops are read from a memory-mapped raw cache")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Write a Chrome trace-event JSON of UI timings to PATH on exit")
+    args = parser.parse_args(argv)
+
     root = tk.Tk()
-    app = HieroglyphAnnotatorGUI(root)
+    app = HieroglyphAnnotatorGUI(root, memory_budget_mb=args.memory_budget, trace_path=args.trace)
     root.mainloop()
 
+# ============================================
+# Headless re-export
+# ============================================
+
+def reexport_image(image_path, records, output_dir, size, background, output_format="png", name_stem=None):
+    """Regenerate all crops of one source image (runs in a worker process)
+
+    PNG files are written directly under a name carrying the hash of their
+    new bytes (crops saved only to packed shards are named like the GUI
+    names them, from `name_stem`). The (record, new output, hash,
+    perceptual hash) of each PNG is returned so the parent can update the
+    database and only then remove the file it supersedes. Crops destined
+    for packed shards are returned to the parent process, which is the
+    only shard writer.
+    """
+    image = decode_image(image_path)
+    if image is None:
+        return 0, len(records), [], []
+
+    written = failed = 0
+    packed = []
+    moved = []
+    for record in records:
+        geometry = record["geometry"]
+        if record["kind"] == "polygon":
+            geometry = [tuple(p) for p in geometry]
+        crop_img = render_crop(image, record["kind"], geometry, size, background)
+        if crop_img is None:
+            failed += 1
+            continue
+        if output_format in ("png", "both"):
+            encoded = io.BytesIO()
+            crop_img.save(encoded, format="PNG")
+            data = encoded.getvalue()
+            content_hash = hashlib.sha1(data).hexdigest()
+            stem = record["output"] or os.path.join(record["code"], f"{name_stem}_{record['kind']}.png")
+            output = content_addressed_path(stem, content_hash)
+            save_path = os.path.join(output_dir, output)
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            with open(save_path, "wb") as f:
+                f.write(data)
+            moved.append((record, output, content_hash, perceptual_hash(crop_img)))
+        if output_format in ("packed", "both"):
+            packed.append((record, crop_img))
+        written += 1
+    return written, failed, packed, moved
+
+
+def parse_color(value):
+    """Parse 'transparent', 'white', 'black' or 'R,G,B' into a background colour"""
+    named = {"transparent": None, "white": (255, 255, 255), "black": (0, 0, 0)}
+    if value.lower() in named:
+        return named[value.lower()]
+    try:
+        rgb = tuple(int(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid colour: {value}")
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise argparse.ArgumentTypeError(f"invalid colour: {value}")
+    return rgb
+
+
+def reexport_main(argv=None):
+    """Regenerate every crop in the dataset from the saved annotation geometry"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    parser = argparse.ArgumentParser(
+        prog="hieroglyph_annotator_gui.py reexport",
+        description="Re-export all annotated crops without opening the GUI")
+    parser.add_argument("--dataset", default="dataset_labeled",
+                        help="Dataset folder holding the annotation database (default: dataset_labeled)")
+    parser.add_argument("--output-dir", help="Where to write the crops (default: the dataset folder)")
+    parser.add_argument("--input-dir", default="Temple_Images",
+                        help="Image folder the crops were annotated from, for naming (default: Temple_Images)")
+    parser.add_argument("--size", type=int, nargs="+", default=[224], metavar="PX",
+                        help="Crop size: one value for square crops or WIDTH HEIGHT")
+    parser.add_argument("--background", type=parse_color, default=None,
+                        help="Polygon background: transparent (default), white, black or R,G,B")
+    parser.add_argument("--format", choices=["png", "packed", "both"], default="png",
+                        help="Write PNG folders, packed shards or both (default: png)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    if len(args.size) not in (1, 2):
+        parser.error("--size takes one or two values")
+    size = (args.size[0], args.size[-1])
+    output_dir = args.output_dir or args.dataset
+
+    db_path = os.path.join(args.dataset, ANNOTATION_DB)
+    if not os.path.exists(db_path):
+        print(f"No annotation database found in '{args.dataset}'")
+        return 1
+    db = AnnotationDatabase(db_path)
+    records = db.saved_annotations()
+
+    # One task per source image so each image is decoded only once
+    by_image = {}
+    for record in records:
+        by_image.setdefault(record["image"], []).append(record)
+
+    print(f"Re-exporting {len(records)} crop(s) from {len(by_image)} image(s) "
+          f"at {size[0]}x{size[1]} with {args.workers} worker(s)")
+    start = time.perf_counter()
+    written = failed = 0
+    # New names only replace old files when the crops stay in the dataset the database describes
+    replace = os.path.abspath(output_dir) == os.path.abspath(args.dataset)
+    # Shards are rebuilt in a staging folder and swapped in at the end, never appended to
+    staging_dir = os.path.join(output_dir, ".reexport")
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    packed_writer = PackedCropWriter(staging_dir, size) if args.format in ("packed", "both") else None
+    relocated = []  # (record, new packed location)
+    def name_stem(image_path):
+        # Images outside the input folder are named after their file alone
+        try:
+            rel_path = os.path.relpath(image_path, args.input_dir)
+        except ValueError:  # Another drive (Windows)
+            rel_path = os.pardir
+        return crop_name_stem(os.path.basename(image_path) if rel_path.startswith(os.pardir) else rel_path)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(reexport_image, image_path, image_records, output_dir, size, args.background,
+                                   args.format, name_stem(image_path)): image_path
+                   for image_path, image_records in by_image.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                image_written, image_failed, packed, moved = future.result()
+            except Exception as e:
+                failed += len(by_image[futures[future]])
+                print(f"  {futures[future]}: failed ({e})")
+                continue
+            for record, crop_img in packed:
+                shard, row = packed_writer.append(crop_img, record["code"], record["image"], record["kind"],
+                                                  record["geometry"], record["id"])
+                relocated.append((record, packed_location(size, shard, row)))
+            if replace:
+                for record, output, content_hash, phash in moved:
+                    db.move_crop(output, content_hash, phash, record)
+                    # The superseded file goes only once nothing in the database points at it
+                    if record["output"] and output != record["output"]:
+                        try:
+                            os.remove(os.path.join(output_dir, record["output"]))
+                        except FileNotFoundError:
+                            pass
+            written += image_written
+            failed += image_failed
+            if image_failed:
+                print(f"  {futures[future]}: {image_failed} crop(s) failed")
+            print(f"[{done}/{len(futures)}] {written} crop(s) written", end="\r")
+
+    if packed_writer is not None:
+        packed_root = os.path.join(output_dir, PACKED_DIR, f"{size[0]}x{size[1]}")
+        if os.path.exists(packed_root):
+            shutil.rmtree(packed_root)
+        os.makedirs(os.path.dirname(packed_root), exist_ok=True)
+        os.replace(packed_writer.root, packed_root)
+        if replace:
+            db.relocate_packed(size, relocated)
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    db.close()
+
+    print(f"\nDone: {written} written, {failed} failed in {time.perf_counter() - start:.1f}s")
+    return 0 if not failed else 2
+
+def stats_main(argv=None):
+    """Print stored crop counts per Gardiner code from the annotation database"""
+    parser = argparse.ArgumentParser(
+        prog="hieroglyph_annotator_gui.py stats",
+        description="Count stored crops per Gardiner code")
+    parser.add_argument("--dataset", default="dataset_labeled",
+                        help="Dataset folder holding the annotation database (default: dataset_labeled)")
+    parser.add_argument("codes", nargs="*", help="Only show these codes")
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(args.dataset, ANNOTATION_DB)
+    if not os.path.exists(db_path):
+        print(f"No annotation database found in '{args.dataset}'")
+        return 1
+    db = AnnotationDatabase(db_path)
+    counts = db.count_by_code()
+    images = len(db.annotated_images())
+    db.close()
+
+    for code in args.codes or counts:
+        print(f"{code:>10}  {counts.get(code, 0)}")
+    print(f"{'Total':>10}  {sum(counts.values())} crop(s) from {images} annotated image(s)")
+    return 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "reexport":
+        sys.exit(reexport_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        sys.exit(stats_main(sys.argv[2:]))
     main()